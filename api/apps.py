@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ApiAppConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        if getattr(settings, 'API_WARM_UP', False):
+            import_string(settings.API_DEFAULT_ROUTER).warm_up()
@@ -0,0 +1,109 @@
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import sys
+
+import django
+import jsonschema
+
+from . import compiler
+from . import schema as s
+
+__all__ = ('ARTIFACT_VERSION', 'source_hash', 'build', 'dump', 'load',)
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+
+
+def _schemas(view):
+    """``(key, schema)`` of payload and response schemas of ``view``."""
+    if isinstance(view.spec.payload, s.Schema) and view.spec.payload is not s.Empty:
+        yield '{}.payload'.format(view.__name__), view.spec.payload
+    for response in view.spec.responses:
+        if response.schema is not None:
+            yield '{}.{}'.format(view.__name__, response.code), response.schema
+
+
+def source_hash(router) -> str:
+    """
+    Hash of everything compiled output depends on: api and router views sources, their schemas and definitions
+    (those may come from any module), interpreter and library versions.
+    """
+    paths = set(glob.glob(os.path.join(os.path.dirname(__file__), '*.py')))
+    for view in router.views():
+        path = inspect.getsourcefile(view)
+        if path:
+            paths.add(os.path.abspath(path))
+
+    digest = hashlib.sha256()
+    digest.update('{}:{}:{}:{}'.format(
+        ARTIFACT_VERSION, sys.version, django.get_version(), getattr(jsonschema, '__version__', '')).encode('utf-8'))
+    for path in sorted(paths):
+        digest.update(path.encode('utf-8'))
+        with open(path, 'rb') as fp:
+            digest.update(hashlib.sha256(fp.read()).digest())
+    schemas = {key: schema.to_json() for view in router.views() for key, schema in _schemas(view)}
+    schemas[s.DEFINITIONS_PATH] = s.DEFINITIONS[s.DEFINITIONS_PATH]
+    digest.update(json.dumps(schemas, sort_keys=True, default=repr).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build(router) -> dict:
+    """Compile validators of every router schema and serialize its swagger document."""
+    validators = {}
+    for view in router.views():
+        for key, schema in _schemas(view):
+            try:
+                validators[key] = compiler.compile_unit(schema)
+            except compiler.CompileError:
+                continue
+    document = router.swagger_document()
+    # evaluate cached properties so they get pickled
+    document.json, document.yaml
+    return {
+        'version': ARTIFACT_VERSION,
+        'hash': source_hash(router),
+        'definitions': compiler.definition_units(),
+        'validators': validators,
+        'swagger': document,
+    }
+
+
+def dump(router, path: str) -> dict:
+    artifact = build(router)
+    with open(path, 'wb') as fp:
+        pickle.dump(artifact, fp, pickle.HIGHEST_PROTOCOL)
+    return artifact
+
+
+def load(router, path: str) -> bool:
+    """
+    Install validators and swagger document of ``router`` from an artifact written by ``manage.py api_compile``.
+    Artifact is ignored (and False returned) when it is missing or was built from other sources,
+    everything is compiled lazily then as usual. Artifacts are pickles, load only ones built by yourself.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            artifact = pickle.load(fp)
+    except FileNotFoundError:
+        logger.warning('api artifact {} not found'.format(path))
+        return False
+    if artifact.get('version') != ARTIFACT_VERSION or artifact.get('hash') != source_hash(router):
+        logger.warning('api artifact {} is stale, run manage.py api_compile'.format(path))
+        return False
+
+    compiler.load_definitions(artifact['definitions'])
+    validators = artifact['validators']
+    for view in router.views():
+        for key, schema in _schemas(view):
+            unit = validators.get(key)
+            if unit is not None and '_compiled' not in schema.__dict__:
+                # fills Schema._compiled cached_property
+                schema.__dict__['_compiled'] = compiler.validator(unit)
+    router.set_swagger_document(artifact['swagger'])
+    return True
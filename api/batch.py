@@ -0,0 +1,130 @@
+import copy
+import logging
+
+from django.db import close_old_connections, connections
+from django.http import HttpRequest, HttpResponse
+from django.utils.datastructures import MultiValueDict
+from django.views import View
+
+from . import schema as s
+from .codec import get_codec
+from .exceptions import RequestContractError, RequestEntityTooLarge, RequestParseError
+from .spec import Method
+
+__all__ = ('BatchView',)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SCHEMA = s.Array(s.Object(
+    operation=s.String()
+))
+
+# representation of entry bodies mustn't depend on these, entries are embedded into the json batch response as is
+_ENTRY_STRIPPED_HEADERS = ('HTTP_ACCEPT', 'HTTP_ACCEPT_ENCODING', 'HTTP_IF_NONE_MATCH')
+
+
+def _query_value(value):
+    if value is True:
+        return 'true'
+    if value is False or value is None:
+        return ''
+    return str(value)
+
+
+def _entry_request(request: HttpRequest) -> HttpRequest:
+    """Copy of batch request entries are handled with, without content negotiation and conditional request headers."""
+    entry = copy.copy(request)
+    entry.META = {key: value for key, value in request.META.items() if key not in _ENTRY_STRIPPED_HEADERS}
+    return entry
+
+
+def _query(payload):
+    """Build query dict of a GET operation from json object, list values become repeated keys."""
+    data = MultiValueDict()
+    for key, value in (payload or {}).items():
+        if isinstance(value, list):
+            data.setlist(key, [_query_value(item) for item in value])
+        else:
+            data[key] = _query_value(value)
+    return data
+
+
+class BatchView(View):
+    """
+    Runs a list of ``{"operation": <SwaggerSpec.name>, "payload": ...}`` entries through the same
+    ``_handle`` pipeline as separate requests would go, responding with ``{"status": ..., "body": ...}`` per entry.
+    """
+    router = None
+
+    def post(self, request: HttpRequest):
+        codec = get_codec()
+        try:
+            entries = codec.loads(request.body)
+        except ValueError:
+            return RequestParseError()
+
+        try:
+            BATCH_SCHEMA.check_and_return(entries)
+        except s.DataError as err:
+            return RequestContractError(codec.dumps(err.as_dict()), content_type='application/json')
+        if len(entries) > self.router.batch_max_size:
+            return RequestEntityTooLarge()
+
+        entry_request = _entry_request(request)
+        calls = [(entry_request, self.router.operation(entry['operation']), entry.get('payload')) for entry in entries]
+        executor = self.router.batch_executor()
+        if executor is None or len(calls) < 2 or self._atomic():
+            results = [self._call(*call) for call in calls]
+        else:
+            results = list(executor.map(self._pooled_call, calls))
+        return HttpResponse(codec.dumps(results), content_type='application/json')
+
+    @staticmethod
+    def _atomic() -> bool:
+        """Entries of ATOMIC_REQUESTS databases have to run in the request thread, inside its transaction."""
+        return any(connection.settings_dict.get('ATOMIC_REQUESTS') for connection in connections.all())
+
+    def _pooled_call(self, call):
+        # pool threads outlive requests, drop their connections like request_started/finished signals would
+        close_old_connections()
+        try:
+            return self._call(*call)
+        finally:
+            close_old_connections()
+
+    def _call(self, request, view_class, payload):
+        if view_class is None:
+            return {'status': 404, 'body': None}
+
+        view = view_class()
+        view.request = request
+        view.args = ()
+        view.kwargs = {}
+        if view_class.spec.method is Method.GET:
+            payload = _query(payload)
+        try:
+            if view_class.is_async:
+                from asgiref.sync import async_to_sync
+                response = async_to_sync(view._ahandle)(payload)
+            else:
+                response = view._handle(payload)
+        except Exception:
+            logger.exception('{} failed in batch'.format(view_class.__name__))
+            return {'status': 500, 'body': None}
+
+        if response.streaming:
+            try:
+                content = b''.join(response.streaming_content)
+            finally:
+                # releases what is held until the body is sent, e.g. concurrency limit slots
+                response.close()
+        else:
+            content = response.content
+        body = None
+        if content and response.get('Content-Type', '').startswith('application/json'):
+            try:
+                body = get_codec().loads(content)
+            except ValueError:
+                # streamed response cut short by a contract violation
+                return {'status': 500, 'body': None}
+        return {'status': response.status_code, 'body': body}
@@ -0,0 +1,176 @@
+import collections
+import hashlib
+import json
+import threading
+import time
+import typing
+import weakref
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+__all__ = ('CachedResponse', 'LocalBackend', 'DjangoBackend', 'ResponseCache', 'invalidate_view', 'invalidate_tag',
+           'query_digest', 'view_name',)
+
+_caches = weakref.WeakSet()
+
+
+def query_digest(data) -> str:
+    """Digest of validated query ``data``, equal for equal queries whatever their parameters order."""
+    query = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(query).hexdigest()
+
+
+def view_name(view) -> str:
+    """Name of ``view`` class in cache keys, unique across routers unlike the bare class name."""
+    return '{}.{}'.format(view.__module__, view.__qualname__)
+
+
+class CachedResponse:
+    def __init__(self, status: int, content: bytes, content_type: str, etag: typing.Optional[str] = None):
+        self.status = status
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+        # encoding -> compressed content, filled on demand
+        self.compressed = {}
+        # time.time() of expiry when stored by ResponseCache
+        self.expires = None
+
+    @classmethod
+    def from_response(cls, response: HttpResponse):
+        return cls(response.status_code, response.content, response['Content-Type'], response.get('ETag'))
+
+    def response(self) -> HttpResponse:
+        response = HttpResponse(self.content, status=self.status, content_type=self.content_type)
+        if self.etag is not None:
+            response['ETag'] = self.etag
+        return response
+
+
+class LocalBackend:
+    """In-process LRU storage, entries are evicted over ``max_entries`` or after their ttl."""
+    # entries are the stored objects themselves, changes of them need no write back
+    stores_copies = False
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = time.monotonic() + ttl, value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, name):
+        return self._generations.get(name, 0)
+
+    def generations(self, names) -> list:
+        return [self._generations.get(name, 0) for name in names]
+
+    def bump(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+
+class DjangoBackend:
+    """Storage in one of django CACHES, generations live there too so invalidation spans processes."""
+    stores_copies = True
+
+    def __init__(self, alias: str = 'default', prefix: str = 'api'):
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get('{}:{}'.format(self.prefix, key))
+
+    def set(self, key, value, ttl):
+        self.cache.set('{}:{}'.format(self.prefix, key), value, ttl)
+
+    def generation(self, name):
+        return self.cache.get('{}:gen:{}'.format(self.prefix, name), 0)
+
+    def generations(self, names) -> list:
+        """Generations of ``names`` in one cache round trip."""
+        keys = ['{}:gen:{}'.format(self.prefix, name) for name in names]
+        values = self.cache.get_many(keys)
+        return [values.get(key, 0) for key in keys]
+
+    def bump(self, name):
+        key = '{}:gen:{}'.format(self.prefix, name)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+
+class ResponseCache:
+    """
+    Cache of serialized successful responses of GET views keyed on validated query.
+    Entries are dropped by bumping a generation of their view (``invalidate_view``)
+    or any of their tags (``invalidate_tag``).
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 1000, backend=None, tags: typing.Iterable[str] = ()):
+        self.ttl = ttl
+        self.backend = backend or LocalBackend(max_entries)
+        self.tags = tuple(tags)
+        _caches.add(self)
+
+    def key(self, view_name: str, data, variant: str = '') -> str:
+        """Key of validated query ``data``, ``variant`` tells apart representations (e.g. wire formats)."""
+        generations = self.backend.generations(
+            ['view:{}'.format(view_name)] + ['tag:{}'.format(tag) for tag in self.tags])
+        return '{}:{}:{}{}'.format(view_name, '.'.join(map(str, generations)), query_digest(data),
+                                   ':' + variant if variant else '')
+
+    def get(self, key) -> typing.Optional[CachedResponse]:
+        return self.backend.get(key)
+
+    def set(self, key, response: HttpResponse) -> typing.Optional[CachedResponse]:
+        if 200 <= response.status_code < 300 and not response.streaming:
+            cached = CachedResponse.from_response(response)
+            cached.expires = time.time() + self.ttl
+            self.backend.set(key, cached, self.ttl)
+            return cached
+        return None
+
+    def update(self, key, cached: CachedResponse):
+        """Write back changes of an entry (e.g. its compressed content) to backends storing copies, keeping expiry."""
+        if cached.expires is None or not self.backend.stores_copies:
+            return
+        ttl = cached.expires - time.time()
+        if ttl > 0:
+            self.backend.set(key, cached, ttl)
+
+
+def invalidate_view(view):
+    cache = view.get_response_cache()
+    if cache is not None:
+        cache.backend.bump('view:{}'.format(view_name(view)))
+
+
+def invalidate_tag(tag: str):
+    backends = {id(cache.backend): cache.backend for cache in list(_caches) if tag in cache.tags}
+    for backend in backends.values():
+        backend.bump('tag:{}'.format(tag))
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+__all__ = ('SingleFlight',)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiting = 0
+        # (loop, future) of async followers, resolved by the leader
+        self.futures = []
+
+    def get(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution: the first caller runs the function,
+    the others (from any thread or event loop) wait for it and get its result or exception.
+    Calls made after it finished run the function again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Returns ``(call, leader)``, the leader has to run the function and ``_done`` the call."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiting += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _done(self, key, call: _Call):
+        with self._lock:
+            del self._calls[key]
+            call.done.set()
+            futures, call.futures = call.futures, []
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # loop is closed, nobody is waiting anymore
+                pass
+
+    def _subscribe(self, call: _Call):
+        """Future of the running loop resolved once ``call`` is done, None when it is done already."""
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        with self._lock:
+            if call.done.is_set():
+                return None
+            call.futures.append((loop, future))
+        return future
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    @property
+    def waiting(self) -> int:
+        """Calls waiting for result of another one."""
+        with self._lock:
+            return sum(call.waiting for call in self._calls.values())
+
+    def do(self, key, function):
+        """``(result of function, leader)``, ``leader`` is False when the result is shared from another call."""
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            return call.get(), False
+        try:
+            call.result = function()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            self._done(key, call)
+        return call.result, True
+
+    async def ado(self, key, function):
+        """Same as ``do`` for coroutine ``function``."""
+        call, leader = self._join(key)
+        if not leader:
+            # leader may run on another thread or loop, the future is resolved from there without holding a thread
+            future = self._subscribe(call)
+            if future is not None:
+                await future
+            return call.get(), False
+        try:
+            call.result = await function()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            self._done(key, call)
+        return call.result, True
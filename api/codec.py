@@ -0,0 +1,157 @@
+import abc
+import functools
+import json
+import logging
+import sys
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import msgpack
+from .exceptions import ConfigurationError
+
+__all__ = ('Codec', 'StdlibCodec', 'OrjsonCodec', 'UjsonCodec', 'MsgpackCodec', 'BACKENDS', 'JSON_CONTENT_TYPE',
+           'MSGPACK_CONTENT_TYPES', 'get_codec', 'content_types', 'accept_types', 'codec_for',)
+
+JSON_CONTENT_TYPE = 'application/json'
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+logger = logging.getLogger(__name__)
+
+
+class Codec(metaclass=abc.ABCMeta):
+    """
+    Wire format backend. ``loads`` accepts ``bytes`` (JSON ones ``str`` too) and raises ValueError on malformed input,
+    ``dumps`` returns ``bytes``.
+    """
+    name = None
+    content_type = JSON_CONTENT_TYPE
+
+    @abc.abstractmethod
+    def loads(self, data):
+        return NotImplemented  # pragma: no cover
+
+    @abc.abstractmethod
+    def dumps(self, obj) -> bytes:
+        return NotImplemented  # pragma: no cover
+
+
+class StdlibCodec(Codec):
+    name = 'json'
+
+    def __init__(self):
+        self._encoder = DjangoJSONEncoder()
+
+    def loads(self, data):
+        if isinstance(data, bytes) and sys.version_info < (3, 6):
+            # json.loads takes bytes (detecting utf-8/16/32 itself) since python 3.6
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode('utf-8')
+
+
+class OrjsonCodec(Codec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._default = DjangoJSONEncoder().default
+        # int/float/bool/None keys are stringified like json module does
+        self._option = orjson.OPT_PASSTHROUGH_DATETIME | getattr(orjson, 'OPT_NON_STR_KEYS', 0)
+        self._fallback = StdlibCodec()
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj):
+        try:
+            return self._orjson.dumps(obj, default=self._default, option=self._option)
+        except self._orjson.JSONEncodeError:
+            # whatever orjson rejects (e.g. integers over 64 bits) is still serialized as json module would
+            return self._fallback.dumps(obj)
+
+
+class UjsonCodec(Codec):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+        self._default = DjangoJSONEncoder().default
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False, default=self._default).encode('utf-8')
+
+
+class MsgpackCodec(Codec):
+    name = 'msgpack'
+    content_type = MSGPACK_CONTENT_TYPES[0]
+
+    def __init__(self):
+        self._default = DjangoJSONEncoder().default
+
+    def loads(self, data):
+        return msgpack.unpackb(data)
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, default=self._default)
+
+
+BACKENDS = {codec.name: codec for codec in (OrjsonCodec, UjsonCodec, StdlibCodec)}
+
+_msgpack = MsgpackCodec()
+
+
+@functools.lru_cache()
+def _load(name) -> Codec:
+    if name == 'auto':
+        for backend in BACKENDS.values():
+            try:
+                return backend()
+            except ImportError:
+                pass
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ConfigurationError('unknown API_JSON_BACKEND {}'.format(name))
+    except ImportError:
+        logger.warning('json backend {} is not installed, falling back to json'.format(name))
+        return StdlibCodec()
+
+
+def get_codec() -> Codec:
+    """Codec selected by API_JSON_BACKEND: one of BACKENDS names or ``auto`` for the fastest installed one."""
+    return _load(getattr(settings, 'API_JSON_BACKEND', StdlibCodec.name))
+
+
+def _msgpack_enabled() -> bool:
+    return getattr(settings, 'API_MSGPACK', True)
+
+
+def content_types() -> list:
+    """Content types views consume and produce, JSON first."""
+    if _msgpack_enabled():
+        return [JSON_CONTENT_TYPE, MsgpackCodec.content_type]
+    return [JSON_CONTENT_TYPE]
+
+
+def accept_types() -> list:
+    """Content types of Accept header views respond to, ``content_types`` and their aliases."""
+    if _msgpack_enabled():
+        return [JSON_CONTENT_TYPE] + list(MSGPACK_CONTENT_TYPES)
+    return [JSON_CONTENT_TYPE]
+
+
+def codec_for(content_type: str):
+    """Codec of a negotiated or request content type, None when it isn't supported."""
+    if content_type == JSON_CONTENT_TYPE:
+        return get_codec()
+    if content_type in MSGPACK_CONTENT_TYPES and _msgpack_enabled():
+        return _msgpack
+    return None
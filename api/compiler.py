@@ -0,0 +1,217 @@
+import itertools
+import marshal
+import threading
+
+import jsonschema
+
+from . import schema as s
+
+__all__ = ('CompileError', 'Unit', 'compile_schema', 'compile_unit', 'validator', 'definition_units',
+           'load_definitions',)
+
+_MISSING = object()
+
+# compiled function of every Definition, shared by all compiled validators
+_definitions = {}
+# and its Unit, kept for build artifacts
+_definition_units = {}
+_definitions_lock = threading.RLock()
+
+_is_type = jsonschema.Draft4Validator({}).is_type
+
+# exact-type fast paths, anything else is delegated to jsonschema's own type checker
+_TYPE_CHECKS = {
+    'object': 'type({0}) is dict or _is_type({0}, \'object\')',
+    'array': 'type({0}) is list or _is_type({0}, \'array\')',
+    'string': 'type({0}) is str or _is_type({0}, \'string\')',
+    'number': 'type({0}) is float or type({0}) is int or _is_type({0}, \'number\')',
+    'integer': 'type({0}) is int or _is_type({0}, \'integer\')',
+    'boolean': '{0} is True or {0} is False',
+    'null': '{0} is None',
+}
+
+
+class CompileError(Exception):
+    pass
+
+
+def _error(message, validator, validator_value, instance, schema, path, schema_path):
+    return jsonschema.ValidationError(message, validator=validator, path=path, validator_value=validator_value,
+                                      instance=instance, schema=schema, schema_path=schema_path)
+
+
+def _tuple_expr(base, parts):
+    if not parts:
+        return base
+    return '{} + ({},)'.format(base, ', '.join(parts))
+
+
+class Unit:
+    """Generated code of one schema with its constants, picklable so it can be stored in a build artifact."""
+
+    def __init__(self, name: str, code, constants: dict):
+        self.name = name
+        self.code = code
+        self.constants = constants
+
+    def __reduce__(self):
+        return _load_unit, (self.name, marshal.dumps(self.code), self.constants)
+
+    def load(self):
+        namespace = {
+            '_MISSING': _MISSING,
+            '_definitions': _definitions,
+            '_error': _error,
+            '_is_type': _is_type,
+        }
+        namespace.update(self.constants)
+        exec(self.code, namespace)
+        return namespace[self.name]
+
+
+def _load_unit(name, code, constants):
+    return Unit(name, marshal.loads(code), constants)
+
+
+def _compile_definition(definition: s.Definition):
+    with _definitions_lock:
+        if definition.reg_name not in _definitions:
+            # placeholder stops recursion for self-referencing definitions, lookup happens at call time only
+            _definitions[definition.reg_name] = None
+            try:
+                unit = _Compiler().build(definition.schema, s.DEFINITIONS[s.DEFINITIONS_PATH][definition.name])
+            except CompileError:
+                del _definitions[definition.reg_name]
+                raise
+            _definitions[definition.reg_name] = unit.load()
+            _definition_units[definition.reg_name] = unit
+
+
+def definition_units() -> dict:
+    """Units of every Definition compiled so far, by reference name."""
+    with _definitions_lock:
+        return dict(_definition_units)
+
+
+def load_definitions(units: dict):
+    """Install definition units from an artifact, definitions compiled already are kept."""
+    with _definitions_lock:
+        for reg_name, unit in units.items():
+            if _definitions.get(reg_name) is None:
+                _definitions[reg_name] = unit.load()
+                _definition_units[reg_name] = unit
+
+
+class _Compiler:
+    def __init__(self):
+        self.functions = []
+        self.lines = None
+        self.constants = {}
+        self.counter = itertools.count()
+
+    def name(self, prefix):
+        return '{}{}'.format(prefix, next(self.counter))
+
+    def constant(self, value):
+        name = self.name('_c')
+        self.constants[name] = value
+        return name
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def function(self, name, schema, json_schema):
+        outer, self.lines = self.lines, ['def {}(instance, path, schema_path, errors):'.format(name)]
+        self.node(1, schema, json_schema, 'instance', [], [])
+        if len(self.lines) == 1:
+            self.emit(1, 'pass')
+        self.functions.append('\n'.join(self.lines))
+        self.lines = outer
+
+    def type_error(self, indent, json_schema, var, path, schema_path):
+        type_name = json_schema['type']
+        self.emit(indent, 'if not ({}):'.format(_TYPE_CHECKS[type_name].format(var)))
+        self.emit(indent + 1, 'errors.append(_error({!r} % ({},), \'type\', {!r}, {}, {}, {}, {}))'.format(
+            '%r is not of type {!r}'.format(type_name), var, type_name, var, self.constant(json_schema),
+            _tuple_expr('path', path), _tuple_expr('schema_path', [repr(p) for p in schema_path + ['type']])
+        ))
+
+    def node(self, indent, schema, json_schema, var, path, schema_path):
+        kind = type(schema)
+        if kind is s.Definition:
+            _compile_definition(schema)
+            self.emit(indent, '_definitions[{!r}]({}, {}, {}, errors)'.format(
+                schema.reg_name, var, _tuple_expr('path', path),
+                _tuple_expr('schema_path', [repr(p) for p in schema_path])
+            ))
+        elif kind in (s.Object, s.Query, s.Page):
+            self.type_error(indent, json_schema, var, path, schema_path)
+            if not schema.properties:
+                return
+            self.emit(indent, 'else:')
+            schema_const = self.constant(json_schema)
+            for key in sorted(schema.properties):
+                value = schema.properties[key]
+                required = not isinstance(value, s.Optional)
+                if not required:
+                    value = value.schema
+                item = self.name('v')
+                self.emit(indent + 1, '{} = {}.get({!r}, _MISSING)'.format(item, var, key))
+                if required:
+                    self.emit(indent + 1, 'if {} is _MISSING:'.format(item))
+                    template = 'errors.append(_error({!r}, \'required\', {}[\'required\'], {}, {}, {}, {}))'
+                    self.emit(indent + 2, template.format(
+                        '{!r} is a required property'.format(key), schema_const, var, schema_const,
+                        _tuple_expr('path', path),
+                        _tuple_expr('schema_path', [repr(p) for p in schema_path + ['required']])
+                    ))
+                    self.emit(indent + 1, 'else:')
+                else:
+                    self.emit(indent + 1, 'if {} is not _MISSING:'.format(item))
+                self.node(indent + 2, value, json_schema['properties'][key], item,
+                          path + [repr(key)], schema_path + ['properties', key])
+        elif kind is s.Array:
+            self.type_error(indent, json_schema, var, path, schema_path)
+            self.emit(indent, 'else:')
+            if 'maxItems' in json_schema:
+                self.emit(indent + 1, 'if len({}) > {!r}:'.format(var, json_schema['maxItems']))
+                self.emit(indent + 2, 'errors.append(_error({!r} % ({},), \'maxItems\', {!r}, {}, {}, {}, {}))'.format(
+                    '%r is too long', var, json_schema['maxItems'], var, self.constant(json_schema),
+                    _tuple_expr('path', path),
+                    _tuple_expr('schema_path', [repr(p) for p in schema_path + ['maxItems']])
+                ))
+            index, item = self.name('i'), self.name('v')
+            self.emit(indent + 1, 'for {}, {} in enumerate({}):'.format(index, item, var))
+            self.node(indent + 2, schema.schema, json_schema['items'], item, path + [index], schema_path + ['items'])
+        elif kind in (s.Number, s.Integer, s.String, s.Boolean, s.Null):
+            self.type_error(indent, json_schema, var, path, schema_path)
+        else:
+            raise CompileError('unable to compile {}'.format(kind.__name__))
+
+    def build(self, schema, json_schema) -> Unit:
+        name = self.name('_f')
+        self.function(name, schema, json_schema)
+        source = '\n\n'.join(self.functions)
+        return Unit(name, compile(source, '<api.compiler {}>'.format(type(schema).__name__), 'exec'), self.constants)
+
+
+def compile_unit(schema: s.Schema) -> Unit:
+    return _Compiler().build(schema, schema.to_json())
+
+
+def validator(unit: Unit):
+    """
+    Function with a ``(instance, errors)`` signature which appends ``jsonschema.ValidationError`` instances
+    to ``errors``, exactly as ``Draft4Validator.iter_errors`` would yield them.
+    """
+    func = unit.load()
+
+    def validate(instance, errors):
+        func(instance, (), (), errors)
+
+    return validate
+
+
+def compile_schema(schema: s.Schema):
+    """Compile schema into a validator function, see ``validator``."""
+    return validator(compile_unit(schema))
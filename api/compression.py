@@ -0,0 +1,53 @@
+import gzip
+import io
+import time
+import typing
+import zlib
+
+from django.http import HttpRequest
+
+from .exceptions import ConfigurationError
+from .http import accepts_encoding
+
+__all__ = ('Compression',)
+
+# per-thread cpu clock is python 3.7+
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+
+def _gzip(content: bytes, level: int) -> bytes:
+    # gzip.compress takes mtime since python 3.8 only, fixed mtime keeps output (and etags of it) stable
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=level, mtime=0) as fp:
+        fp.write(content)
+    return buf.getvalue()
+
+
+class Compression:
+    """
+    Response compression policy: bodies shorter than ``min_size`` are sent as is,
+    otherwise the first of ``encodings`` accepted by the client is used.
+    """
+
+    def __init__(self, min_size: int = 1024, level: int = 6, encodings: typing.Sequence[str] = ('gzip', 'deflate')):
+        self.min_size = min_size
+        self.level = level
+        self.encodings = tuple(encodings)
+        for encoding in self.encodings:
+            if encoding not in ('gzip', 'deflate'):
+                raise ConfigurationError('unsupported encoding {}'.format(encoding))
+
+    def negotiate(self, request: HttpRequest) -> typing.Optional[str]:
+        for encoding in self.encodings:
+            if accepts_encoding(request, encoding):
+                return encoding
+        return None
+
+    def compress(self, content: bytes, encoding: str) -> typing.Tuple[bytes, float]:
+        """Return compressed content and cpu time spent on it."""
+        start = _cpu_time()
+        if encoding == 'gzip':
+            content = _gzip(content, self.level)
+        else:
+            content = zlib.compress(content, self.level)
+        return content, _cpu_time() - start
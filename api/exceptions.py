@@ -1,4 +1,4 @@
-from django.http import HttpResponseBadRequest, HttpResponseNotAllowed, HttpResponseServerError
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, HttpResponseServerError
 
 
 class ConfigurationError(Exception):
@@ -19,3 +19,15 @@ class RequestParseError(HttpResponseBadRequest):
 
 class ResponseContractError(HttpResponseServerError):
     pass
+
+
+class RequestEntityTooLarge(HttpResponse):
+    status_code = 413
+
+
+class TooManyRequests(HttpResponse):
+    status_code = 429
+
+
+class ServiceUnavailable(HttpResponse):
+    status_code = 503
@@ -0,0 +1,128 @@
+import collections.abc
+import functools
+import typing
+
+import jsonschema
+
+from . import schema as s
+
+__all__ = ('parse_fields', 'project_schema', 'project',)
+
+
+def _error(message):
+    return s.DataError([jsonschema.ValidationError(message=message, path=['fields'])])
+
+
+def _items(schema: s.Schema) -> s.Schema:
+    """Schema ``fields`` apply to: objects themselves, items of arrays and pages."""
+    while True:
+        if isinstance(schema, s.Definition):
+            schema = schema.schema
+        elif isinstance(schema, s.Page):
+            return schema
+        elif isinstance(schema, s.Array):
+            schema = schema.schema
+        else:
+            return schema
+
+
+def _check(schema: s.Schema, tree: dict, prefix: str):
+    schema = _items(schema)
+    if isinstance(schema, s.Page):
+        schema = _items(schema.schema)
+    if not isinstance(schema, s.Object):
+        raise _error('{!r} has no fields'.format(prefix))
+    for key, subtree in tree.items():
+        path = '{}.{}'.format(prefix, key) if prefix else key
+        value = schema.properties.get(key)
+        if value is None:
+            raise _error('unknown field {!r}'.format(path))
+        if subtree:
+            _check(value.schema if isinstance(value, s.Optional) else value, subtree, path)
+
+
+def parse_fields(value: typing.Optional[str], schema: s.Schema) -> typing.Optional[dict]:
+    """
+    Parse ``a,b.c`` into ``{'a': {}, 'b': {'c': {}}}`` (empty dict selects the whole value),
+    raising DataError when a path is missing from ``schema``.
+    """
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        parts = path.split('.')
+        for idx, part in enumerate(parts):
+            if not part:
+                raise _error('invalid field {!r}'.format(path))
+            if part in node and not node[part] and idx < len(parts) - 1:
+                # whole value is selected already
+                break
+            node = node.setdefault(part, {})
+            if idx == len(parts) - 1:
+                node.clear()
+    if not tree:
+        raise _error('no fields requested')
+    _check(schema, tree, '')
+    return tree
+
+
+def _freeze(tree: dict) -> tuple:
+    return tuple(sorted((key, _freeze(subtree)) for key, subtree in tree.items()))
+
+
+def project_schema(schema: s.Schema, tree: dict) -> s.Schema:
+    """Schema of ``tree`` fields of ``schema``, cached so its compiled validator is reused."""
+    return _project_schema(schema, _freeze(tree))
+
+
+@functools.lru_cache(maxsize=256)
+def _project_schema(schema: s.Schema, frozen: tuple) -> s.Schema:
+    if isinstance(schema, s.Definition):
+        return _project_schema(schema.schema, frozen)
+    if isinstance(schema, s.Page):
+        return s.Page(_project_schema(schema.schema, frozen), schema.max_limit, schema.default_limit)
+    if isinstance(schema, s.Array):
+        return s.Array(_project_schema(schema.schema, frozen))
+    properties = {}
+    for key, subtree in frozen:
+        value = schema.properties[key]
+        optional = isinstance(value, s.Optional)
+        if optional:
+            value = value.schema
+        if subtree:
+            value = _project_schema(value, subtree)
+        properties[key] = s.Optional(value) if optional else value
+    return s.Object(**properties)
+
+
+def project(schema: s.Schema, data, tree: dict):
+    """
+    Keep ``tree`` fields of ``data`` shaped as ``schema``,
+    anything not matching the schema is left for validation.
+    """
+    if isinstance(schema, s.Definition):
+        return project(schema.schema, data, tree)
+    if isinstance(schema, s.Page):
+        if isinstance(data, dict) and isinstance(data.get('items'), list):
+            data = dict(data, items=[project(schema.schema, item, tree) for item in data['items']])
+        return data
+    if isinstance(schema, s.Array):
+        if isinstance(data, list):
+            return [project(schema.schema, item, tree) for item in data]
+        if isinstance(data, collections.abc.Iterator):
+            return (project(schema.schema, item, tree) for item in data)
+        return data
+    if isinstance(data, dict):
+        res = {}
+        for key, subtree in tree.items():
+            if key in data:
+                value = schema.properties[key]
+                if isinstance(value, s.Optional):
+                    value = value.schema
+                res[key] = project(value, data[key], subtree) if subtree else data[key]
+        return res
+    return data
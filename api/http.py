@@ -0,0 +1,79 @@
+import hashlib
+import re
+import typing
+
+from django.http import HttpRequest
+
+__all__ = ('make_etag', 'etag_matches', 'accepts_encoding', 'negotiate',)
+
+_encoding_re_cache = {}
+
+
+def make_etag(content: bytes) -> str:
+    return '"{}"'.format(hashlib.sha1(content).hexdigest())
+
+
+def etag_matches(request: HttpRequest, etag: str) -> bool:
+    """Weak comparison of etag against request If-None-Match header."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def accepts_encoding(request: HttpRequest, encoding: str) -> bool:
+    header = request.META.get('HTTP_ACCEPT_ENCODING')
+    if not header:
+        return False
+    regex = _encoding_re_cache.get(encoding)
+    if regex is None:
+        regex = _encoding_re_cache[encoding] = re.compile(r'\b{}\b(?!\s*;\s*q=0(\.0*)?\s*(,|$))'.format(encoding))
+    return regex.search(header) is not None
+
+
+def _accept_quality(header: str, content_type: str) -> float:
+    """Quality of the most specific Accept entry matching content_type, 0 if none does."""
+    main_type = content_type.split('/')[0] + '/*'
+    best, quality = -1, 0.0
+    for entry in header.split(','):
+        media_range, *params = entry.split(';')
+        media_range = media_range.strip().lower()
+        if media_range == content_type:
+            specificity = 2
+        elif media_range == main_type:
+            specificity = 1
+        elif media_range == '*/*':
+            specificity = 0
+        else:
+            continue
+        if specificity > best:
+            best, quality = specificity, 1.0
+            for param in params:
+                name, _, value = param.partition('=')
+                if name.strip() == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+    return quality
+
+
+def negotiate(request: HttpRequest, content_types: typing.Sequence[str]) -> str:
+    """Content type from ``content_types`` preferred by request Accept header, the first one on a tie or no match."""
+    header = request.META.get('HTTP_ACCEPT')
+    if not header or len(content_types) == 1:
+        return content_types[0]
+    best, best_quality = content_types[0], 0.0
+    for content_type in content_types:
+        quality = _accept_quality(header, content_type)
+        if quality > best_quality:
+            best, best_quality = content_type, quality
+    return best
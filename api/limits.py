@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+from .exceptions import ConfigurationError, ServiceUnavailable, TooManyRequests
+
+__all__ = ('ConcurrencyLimit',)
+
+
+class ConcurrencyLimit:
+    """
+    At most ``max_concurrent`` requests are handled at once, up to ``max_queue`` more wait
+    for ``queue_timeout`` seconds for a free slot, the rest are shed with ``status`` (503 or 429)
+    and ``Retry-After: retry_after``. Views sharing a limit instance share its slots.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int = 0, queue_timeout: float = 1.0, status: int = 503,
+                 retry_after: int = 1):
+        if status not in (429, 503):
+            raise ConfigurationError('concurrency limit status must be 429 or 503, got {}'.format(status))
+        if max_concurrent < 1:
+            raise ConfigurationError('max_concurrent must be positive')
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.status = status
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self._condition = threading.Condition()
+
+    def _try_acquire(self):
+        """True when a slot is taken, False when request is to be shed, None when it may wait in the queue."""
+        if self.in_flight < self.max_concurrent:
+            self.in_flight += 1
+            return True
+        if self.queued >= self.max_queue:
+            return False
+        return None
+
+    def acquire(self) -> bool:
+        with self._condition:
+            acquired = self._try_acquire()
+            if acquired is not None:
+                return acquired
+            self.queued += 1
+            try:
+                acquired = self._condition.wait_for(lambda: self.in_flight < self.max_concurrent, self.queue_timeout)
+            finally:
+                self.queued -= 1
+            if acquired:
+                self.in_flight += 1
+            return acquired
+
+    async def aacquire(self) -> bool:
+        with self._condition:
+            acquired = self._try_acquire()
+        if acquired is not None:
+            return acquired
+        # waiting for a slot must not block the event loop
+        future = asyncio.get_event_loop().run_in_executor(None, self.acquire)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # executor thread keeps waiting, a slot it takes has nobody to release it
+            future.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            self.release()
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def response(self):
+        response = (ServiceUnavailable if self.status == 503 else TooManyRequests)()
+        response['Retry-After'] = str(self.retry_after)
+        return response
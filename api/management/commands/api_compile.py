@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from ... import artifact
+
+
+class Command(BaseCommand):
+    help = 'Precompile validators and swagger document of a router into an artifact loaded at startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--router', default=None, help='router import path, API_DEFAULT_ROUTER by default')
+        parser.add_argument('--output', default=None, help='artifact path, API_ARTIFACT by default')
+
+    def handle(self, *args, **options):
+        router = import_string(options['router'] or settings.API_DEFAULT_ROUTER)
+        path = options['output'] or router.artifact or getattr(settings, 'API_ARTIFACT', None)
+        if not path:
+            raise CommandError('artifact path is not set, pass --output or set API_ARTIFACT')
+        built = artifact.dump(router, path)
+        self.stdout.write('{} validators, {} definitions written to {}'.format(
+            len(built['validators']), len(built['definitions']), path))
@@ -0,0 +1,161 @@
+import bisect
+import collections
+import threading
+
+from django.http import HttpRequest, HttpResponse
+from django.views import View
+
+__all__ = ('ViewStats', 'Histogram', 'MetricsView', 'render', 'LATENCY_BUCKETS', 'SIZE_BUCKETS',)
+
+LATENCY_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """Counts of observed values per upper bound of ``buckets``, the last count is for values above all of them."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram'):
+        for idx, count in enumerate(other.counts):
+            self.counts[idx] += count
+        self.sum += other.sum
+        self.count += other.count
+
+
+class ViewStats:
+    """
+    Counters, gauges and histograms of a single view.
+    Histograms are kept per thread so ``observe`` takes no lock, ``histograms`` merges them on read.
+    Shards of finished threads are folded into ``_base`` whenever a new one is added or read,
+    so thread-per-connection servers don't pile them up.
+    Names may carry prometheus labels, e.g. ``phase_seconds{phase="handle"}``.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._counters = collections.Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (thread, shard) of threads which observed anything
+        self._shards = []
+        self._base = {}
+        self._gauges = {}
+
+    def incr(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def __getitem__(self, counter: str) -> int:
+        return self._counters[counter]
+
+    def counters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def gauge(self, name: str, getter):
+        """Register a gauge, ``getter`` returns its current value."""
+        self._gauges[name] = getter
+
+    def gauges(self) -> dict:
+        return {name: getter() for name, getter in self._gauges.items()}
+
+    def observe(self, metric: str, value, buckets=LATENCY_BUCKETS):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._fold()
+                self._shards.append((threading.current_thread(), shard))
+        histogram = shard.get(metric)
+        if histogram is None:
+            histogram = shard[metric] = Histogram(buckets)
+        histogram.observe(value)
+
+    def _fold(self):
+        """Merge shards of finished threads into ``_base``, called with ``_lock`` held."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+                continue
+            for metric, histogram in shard.items():
+                if metric not in self._base:
+                    self._base[metric] = Histogram(histogram.buckets)
+                self._base[metric].merge(histogram)
+        self._shards = live
+
+    def histograms(self) -> dict:
+        merged = {}
+        with self._lock:
+            self._fold()
+            shards = [shard for _, shard in self._shards]
+            for metric, histogram in self._base.items():
+                merged[metric] = Histogram(histogram.buckets)
+                merged[metric].merge(histogram)
+        for shard in shards:
+            for metric, histogram in list(shard.items()):
+                if metric not in merged:
+                    merged[metric] = Histogram(histogram.buckets)
+                merged[metric].merge(histogram)
+        return merged
+
+
+def _split(name: str, view: str):
+    """``'phase_seconds{phase="parse"}'`` -> ``('api_phase_seconds', 'view="X",phase="parse"')``"""
+    name, _, labels = name.partition('{')
+    labels = 'view="{}"'.format(view) + (',' + labels[:-1] if labels else '')
+    return 'api_' + name, labels
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(views) -> str:
+    """Prometheus text exposition of stats of ``views``."""
+    families = collections.OrderedDict()
+
+    def add(family, kind, line):
+        if family not in families:
+            families[family] = (kind, [])
+        families[family][1].append(line)
+
+    for view in views:
+        for counter, value in sorted(view.stats.counters().items()):
+            name, labels = _split(counter, view.stats.name)
+            add(name + '_total', 'counter', '{}_total{{{}}} {}'.format(name, labels, value))
+        for gauge, value in sorted(view.stats.gauges().items()):
+            name, labels = _split(gauge, view.stats.name)
+            add(name, 'gauge', '{}{{{}}} {}'.format(name, labels, _number(value)))
+        for metric, histogram in sorted(view.stats.histograms().items()):
+            name, labels = _split(metric, view.stats.name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                add(name, 'histogram', '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative))
+            add(name, 'histogram', '{}_sum{{{}}} {}'.format(name, labels, _number(histogram.sum)))
+            add(name, 'histogram', '{}_count{{{}}} {}'.format(name, labels, histogram.count))
+
+    lines = []
+    for family, (kind, samples) in families.items():
+        lines.append('# TYPE {} {}'.format(family, kind))
+        lines += samples
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsView(View):
+    router = None
+
+    def get(self, request: HttpRequest):
+        return HttpResponse(render(self.router.views()), content_type='text/plain; version=0.0.4; charset=utf-8')
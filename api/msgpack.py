@@ -0,0 +1,236 @@
+"""
+Pure-python MessagePack (https://msgpack.org/) of json-like values: None, bool, int, float, str, bytes, list, dict.
+Floats are always written as float64, arrays of floats are packed and unpacked in one struct call.
+"""
+import itertools
+import struct
+
+__all__ = ('packb', 'unpackb',)
+
+_FLOAT_MARKER = 0xcb
+
+_U8 = struct.Struct('>B')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_U64 = struct.Struct('>Q')
+_I8 = struct.Struct('>b')
+_I16 = struct.Struct('>h')
+_I32 = struct.Struct('>i')
+_I64 = struct.Struct('>q')
+_F32 = struct.Struct('>f')
+_F64 = struct.Struct('>Bd')
+
+
+def _pack_int(obj, buf):
+    if 0 <= obj < 0x80:
+        buf.append(obj)
+    elif -0x20 <= obj < 0:
+        buf.append(obj & 0xff)
+    elif obj >= 0:
+        if obj <= 0xff:
+            buf += b'\xcc' + _U8.pack(obj)
+        elif obj <= 0xffff:
+            buf += b'\xcd' + _U16.pack(obj)
+        elif obj <= 0xffffffff:
+            buf += b'\xce' + _U32.pack(obj)
+        elif obj <= 0xffffffffffffffff:
+            buf += b'\xcf' + _U64.pack(obj)
+        else:
+            raise ValueError('integer {} is too large for msgpack'.format(obj))
+    elif obj >= -0x80:
+        buf += b'\xd0' + _I8.pack(obj)
+    elif obj >= -0x8000:
+        buf += b'\xd1' + _I16.pack(obj)
+    elif obj >= -0x80000000:
+        buf += b'\xd2' + _I32.pack(obj)
+    elif obj >= -0x8000000000000000:
+        buf += b'\xd3' + _I64.pack(obj)
+    else:
+        raise ValueError('integer {} is too large for msgpack'.format(obj))
+
+
+def _pack_header(size, fix, fix_limit, codes, buf):
+    if size < fix_limit:
+        buf.append(fix | size)
+    elif size <= 0xffff:
+        buf += codes[0] + _U16.pack(size)
+    else:
+        buf += codes[1] + _U32.pack(size)
+
+
+def _pack_str(obj, buf):
+    data = obj.encode('utf-8')
+    size = len(data)
+    if size < 32:
+        buf.append(0xa0 | size)
+    elif size <= 0xff:
+        buf += b'\xd9' + _U8.pack(size)
+    elif size <= 0xffff:
+        buf += b'\xda' + _U16.pack(size)
+    else:
+        buf += b'\xdb' + _U32.pack(size)
+    buf += data
+
+
+def _pack_bin(obj, buf):
+    size = len(obj)
+    if size <= 0xff:
+        buf += b'\xc4' + _U8.pack(size)
+    elif size <= 0xffff:
+        buf += b'\xc5' + _U16.pack(size)
+    else:
+        buf += b'\xc6' + _U32.pack(size)
+    buf += obj
+
+
+def _pack_list(obj, buf, default):
+    _pack_header(len(obj), 0x90, 16, (b'\xdc', b'\xdd'), buf)
+    if obj and all(type(item) is float for item in obj):
+        buf += struct.pack('>' + 'Bd' * len(obj), *itertools.chain.from_iterable(
+            zip(itertools.repeat(_FLOAT_MARKER), obj)))
+    else:
+        for item in obj:
+            _pack(item, buf, default)
+
+
+def _pack_dict(obj, buf, default):
+    _pack_header(len(obj), 0x80, 16, (b'\xde', b'\xdf'), buf)
+    for key, value in obj.items():
+        _pack(key, buf, default)
+        _pack(value, buf, default)
+
+
+def _pack(obj, buf, default):
+    kind = type(obj)
+    if obj is None:
+        buf.append(0xc0)
+    elif obj is True:
+        buf.append(0xc3)
+    elif obj is False:
+        buf.append(0xc2)
+    elif kind is int:
+        _pack_int(obj, buf)
+    elif kind is float:
+        buf += _F64.pack(_FLOAT_MARKER, obj)
+    elif kind is str:
+        _pack_str(obj, buf)
+    elif kind is list:
+        _pack_list(obj, buf, default)
+    elif kind is dict:
+        _pack_dict(obj, buf, default)
+    # subclasses (IntEnum, SafeString, OrderedDict...) and less common types
+    elif isinstance(obj, int):
+        _pack_int(int(obj), buf)
+    elif isinstance(obj, float):
+        buf += _F64.pack(_FLOAT_MARKER, obj)
+    elif isinstance(obj, str):
+        _pack_str(obj, buf)
+    elif isinstance(obj, (list, tuple)):
+        _pack_list(obj, buf, default)
+    elif isinstance(obj, dict):
+        _pack_dict(obj, buf, default)
+    elif isinstance(obj, (bytes, bytearray)):
+        _pack_bin(obj, buf)
+    elif default is not None:
+        _pack(default(obj), buf, default)
+    else:
+        raise TypeError('{} is not msgpack serializable'.format(kind.__name__))
+
+
+def packb(obj, default=None) -> bytes:
+    """Serialize ``obj``, ``default`` converts otherwise unsupported values like ``json.JSONEncoder.default``."""
+    buf = bytearray()
+    _pack(obj, buf, default)
+    return bytes(buf)
+
+
+class _Unpacker:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        start = self.pos
+        end = self.pos = start + size
+        if end > len(self.data):
+            raise ValueError('unexpected end of msgpack data')
+        return start
+
+    def array(self, size):
+        data, pos = self.data, self.pos
+        end = pos + 9 * size
+        if size and end <= len(data) and data[pos:end:9] == b'\xcb' * size:
+            # float64 array, one struct call for all of it
+            self.pos = end
+            return list(struct.unpack_from('>' + 'xd' * size, data, pos))
+        return [self.value() for _ in range(size)]
+
+    def map(self, size):
+        res = {}
+        for _ in range(size):
+            key = self.value()
+            res[key] = self.value()
+        return res
+
+    def str(self, size):
+        start = self.take(size)
+        return self.data[start:self.pos].decode('utf-8')
+
+    def bin(self, size):
+        start = self.take(size)
+        return self.data[start:self.pos]
+
+    def value(self):
+        data = self.data
+        code = data[self.take(1)]
+        if code < 0x80:
+            return code
+        if code >= 0xe0:
+            return code - 0x100
+        if code <= 0x8f:
+            return self.map(code & 0x0f)
+        if code <= 0x9f:
+            return self.array(code & 0x0f)
+        if code <= 0xbf:
+            return self.str(code & 0x1f)
+        if code == 0xc0:
+            return None
+        if code == 0xc2:
+            return False
+        if code == 0xc3:
+            return True
+        if code == 0xcb:
+            return struct.unpack_from('>d', data, self.take(8))[0]
+        if code == 0xca:
+            return _F32.unpack_from(data, self.take(4))[0]
+        reader = _READERS.get(code)
+        if reader is None:
+            raise ValueError('unsupported msgpack type 0x{:02x}'.format(code))
+        fmt, method = reader
+        value = fmt.unpack_from(data, self.take(fmt.size))[0]
+        return getattr(self, method)(value) if method else value
+
+
+_READERS = {
+    0xcc: (_U8, None), 0xcd: (_U16, None), 0xce: (_U32, None), 0xcf: (_U64, None),
+    0xd0: (_I8, None), 0xd1: (_I16, None), 0xd2: (_I32, None), 0xd3: (_I64, None),
+    0xd9: (_U8, 'str'), 0xda: (_U16, 'str'), 0xdb: (_U32, 'str'),
+    0xc4: (_U8, 'bin'), 0xc5: (_U16, 'bin'), 0xc6: (_U32, 'bin'),
+    0xdc: (_U16, 'array'), 0xdd: (_U32, 'array'),
+    0xde: (_U16, 'map'), 0xdf: (_U32, 'map'),
+}
+
+
+def unpackb(data: bytes):
+    """Deserialize single msgpack value, raising ValueError on malformed or trailing data."""
+    unpacker = _Unpacker(bytes(data))
+    try:
+        value = unpacker.value()
+    except RecursionError:
+        raise ValueError('msgpack data is nested too deep')
+    except TypeError:
+        # unhashable map key
+        raise ValueError('unsupported msgpack map key')
+    if unpacker.pos != len(unpacker.data):
+        raise ValueError('unexpected data after msgpack value')
+    return value
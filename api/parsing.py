@@ -0,0 +1,35 @@
+from django.core.handlers.wsgi import WSGIRequest, get_str_from_wsgi
+from django.http import HttpRequest
+
+__all__ = ('BodyTooLarge', 'read_body', 'query_string',)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def read_body(request: HttpRequest, limit: int, chunk_size: int = CHUNK_SIZE) -> bytes:
+    """Read request body in chunks, raising BodyTooLarge as soon as more than ``limit`` bytes are read."""
+    chunks = []
+    size = 0
+    while True:
+        chunk = request.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def query_string(request: HttpRequest) -> str:
+    """
+    Raw query string decoded the way request.GET gets it: WSGI environ holds latin-1 decoded bytes
+    which are decoded again as utf-8, ASGI servers decode it themselves.
+    """
+    if isinstance(request, WSGIRequest):
+        return get_str_from_wsgi(request.environ, 'QUERY_STRING', '')
+    return request.META.get('QUERY_STRING', '')
@@ -0,0 +1,214 @@
+import cProfile
+import collections
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from .exceptions import ConfigurationError
+
+__all__ = ('Profile', 'profile',)
+
+MODES = ('sample', 'cprofile')
+
+
+def _label(code) -> str:
+    return '{} ({}:{})'.format(code.co_name, code.co_filename, code.co_firstlineno)
+
+
+class _Sampler(threading.Thread):
+    """Collects stacks of registered threads every ``interval`` seconds, below the frame each one was registered at."""
+
+    def __init__(self, interval: float):
+        super().__init__(name='api-profile-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def register(self, root):
+        with self._lock:
+            self._targets[threading.get_ident()] = root
+
+    def unregister(self):
+        with self._lock:
+            self._targets.pop(threading.get_ident(), None)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                targets = list(self._targets.items())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for ident, root in targets:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and frame is not root:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                if frame is root:
+                    stack.append(_label(root.f_code))
+                    self.stacks[';'.join(reversed(stack))] += 1
+
+
+class Profile:
+    """
+    Profiles ``requests`` requests of ``view`` (each one picked with probability ``rate``),
+    then writes aggregated output to ``directory`` and removes itself. With ``requests=None``
+    it runs until ``stop``.
+    ``sample`` mode writes collapsed stacks (flamegraph.pl / speedscope input),
+    ``cprofile`` mode writes a pstats dump and profiles one request at a time.
+    While running, ``view._handle`` is shadowed on the view class, so views not being profiled pay nothing.
+    """
+
+    def __init__(self, view, requests: int = 100, rate: float = 1.0, directory: str = None,
+                 mode: str = 'sample', interval: float = 0.001):
+        if mode not in MODES:
+            raise ConfigurationError('unknown profile mode {}'.format(mode))
+        self.view = view
+        self.requests = requests
+        self.rate = rate
+        self.directory = directory or getattr(settings, 'API_PROFILE_DIR', None) or tempfile.gettempdir()
+        self.mode = mode
+        self.interval = interval
+        self.path = None
+        self.profiled = 0
+        self._remaining = requests
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self._sampler = None
+        self._profiler = None
+        self._handler = None
+
+    @property
+    def active(self) -> bool:
+        return self._handler is not None
+
+    def start(self) -> 'Profile':
+        if '_handle' in self.view.__dict__:
+            raise ConfigurationError('{} is already profiled'.format(self.view.__name__))
+        if self.mode == 'sample':
+            self._sampler = _Sampler(self.interval)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+
+        profile = self
+        original = self.view._handle
+
+        def _handle(view, data):
+            if not profile._acquire():
+                return original(view, data)
+            if view.is_async:
+                return profile._acall(original, view, data)
+            try:
+                return profile._call(original, view, data)
+            finally:
+                profile._release()
+
+        self._handler = _handle
+        self.view._handle = _handle
+        return self
+
+    def stop(self):
+        """Remove profiling hook and write collected data, returns path of the output file if anything was profiled."""
+        with self._lock:
+            if self._handler is None:
+                return self.path
+            if self.view.__dict__.get('_handle') is self._handler:
+                del self.view._handle
+            self._handler = None
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self.profiled:
+            self.path = self._write()
+        return self.path
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._handler is None or self._remaining == 0 or random.random() >= self.rate:
+                return False
+            if self._profiler is not None and not self._busy.acquire(blocking=False):
+                # cProfile can't follow concurrent requests
+                return False
+            if self._remaining is not None:
+                self._remaining -= 1
+            self._pending += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            if self._profiler is not None:
+                self._busy.release()
+            self._pending -= 1
+            self.profiled += 1
+            done = self._remaining == 0 and self._pending == 0
+        if done:
+            self.stop()
+
+    def _call(self, original, view, data):
+        if self._profiler is not None:
+            return self._profiler.runcall(original, view, data)
+        # stacks start at the _handle wrapper
+        self._sampler.register(sys._getframe(1))
+        try:
+            return original(view, data)
+        finally:
+            self._sampler.unregister()
+
+    async def _acall(self, original, view, data):
+        # samples and calls of other tasks running on the loop while handle awaits are included
+        try:
+            if self._profiler is not None:
+                self._profiler.enable()
+                try:
+                    return await original(view, data)
+                finally:
+                    self._profiler.disable()
+            self._sampler.register(sys._getframe())
+            try:
+                return await original(view, data)
+            finally:
+                self._sampler.unregister()
+        finally:
+            self._release()
+
+    def _write(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '{}-{}-{}.{}'.format(
+            self.view.__name__, os.getpid(), int(time.time() * 1000), 'collapsed' if self._sampler else 'prof'))
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as fp:
+                for stack, count in sorted(self._sampler.stacks.items()):
+                    fp.write('{} {}\n'.format(stack, count))
+        return path
+
+
+def profile(view, requests: int = 100, rate: float = 1.0, directory: str = None, mode: str = 'sample',
+            interval: float = 0.001) -> Profile:
+    """
+    Start profiling next ``requests`` requests of ``view``, e.g. from a shell::
+
+        api.profiling.profile(SearchView, requests=50, rate=0.1).path  # set once done
+    """
+    return Profile(view, requests, rate, directory, mode, interval).start()
+
+
+def configure(view):
+    """Start profiling of ``view`` listed in API_PROFILE setting, ``{view name: profile kwargs}``."""
+    options = (getattr(settings, 'API_PROFILE', None) or {}).get(view.__name__)
+    if options is not None:
+        profile(view, **options)
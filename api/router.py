@@ -1,9 +1,18 @@
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
 from django.conf.urls import url
+from django.http import Http404
 
+from . import artifact
 from . import schema as s
-from .views import ApiView
+from .batch import BatchView
+from .metrics import MetricsView
+from .swagger import SwaggerDocument, SwaggerView
+from .codec import content_types, get_codec
+from .views import registry
 
 
 def snake_case(name):
@@ -11,34 +20,164 @@ def snake_case(name):
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
+def _unreachable(request, **kwargs):
+    raise Http404()  # pragma: no cover
+
+
+_UrlPattern = type(url(r'^$', _unreachable))
+
+
+class DictDispatchPattern(_UrlPattern):
+    """
+    Resolves ``<name>/`` by an exact dict lookup instead of trying every view pattern in turn.
+    Paths missing from the dict don't match at all, so 404 handling stays with Django's resolver.
+    """
+
+    def __init__(self, patterns):
+        self.__dict__.update(url(r'^[^/]+/$', _unreachable).__dict__)
+        self.lookup = {pattern.name: pattern for pattern in patterns}
+
+    def resolve(self, path):
+        if path.endswith('/'):
+            pattern = self.lookup.get(path[:-1])
+            if pattern is not None:
+                return pattern.resolve(path)
+        return None
+
+
 class Router:
 
     def __init__(self, name='api', **kwargs):
         self.name = name
         self.namespace = kwargs.pop('namespace', None)
+        self.dict_dispatch = kwargs.pop('dict_dispatch', False)
+        self.batch = kwargs.pop('batch', False)
+        self.batch_max_size = kwargs.pop('batch_max_size', 50)
+        self.batch_workers = kwargs.pop('batch_workers', 1)
+        self.metrics = kwargs.pop('metrics', False)
+        # swagger is the method building the spec
+        self.serve_swagger = kwargs.pop('swagger', False)
+        self.artifact = kwargs.pop('artifact', None)
+        self._artifact_loaded = None
+        self._batch_executor = None
+        self._lock = threading.Lock()
+        self._swagger_document = None
+        self._swagger_key = None
+        self._views = []
+        self._operations = {}
+        self._indexed = 0
+        self._patterns = None
+        self._patterns_key = None
+
+    def _index(self):
+        """Pick views of this router defined since the last call from the global registry."""
+        if self._indexed < len(registry):
+            with self._lock:
+                for view in registry[self._indexed:]:
+                    if view.router == self:
+                        self._views.append(view)
+                        self._operations[view.swagger_spec.name] = view
+                self._indexed = len(registry)
 
     def views(self):
-        for view in ApiView.__subclasses__():
-            if view.router == self and not view.abstract:
-                yield view
+        self._index()
+        return list(self._views)
+
+    def operation(self, name: str):
+        """View by its swagger operationId, None if there is no such view."""
+        self._index()
+        return self._operations.get(name)
+
+    def load_artifact(self) -> bool:
+        """Use precompiled artifact (``artifact`` argument or API_ARTIFACT setting) once, if there is one."""
+        if self._artifact_loaded is None:
+            path = self.artifact or getattr(settings, 'API_ARTIFACT', None)
+            self._artifact_loaded = bool(path) and artifact.load(self, path)
+        return self._artifact_loaded
 
     @property
     def urls(self):
+        self.load_artifact()
+        views = self.views()
+        key = (len(views), self.dict_dispatch, self.batch, self.metrics, self.serve_swagger)
+        if self._patterns_key != key:
+            self._patterns = self._build_patterns(views)
+            self._patterns_key = key
+        return list(self._patterns), self.name, self.namespace
+
+    def _build_patterns(self, views):
         patterns = []
-        for view in self.views():
+        for view in views:
             name = snake_case(view.swagger_spec.name)
             patterns.append(
                 url('^{}/$'.format(snake_case(view.swagger_spec.name)), view.as_view(), name=name),
             )
-        return patterns, self.name, self.namespace
+        if self.dict_dispatch:
+            # view patterns are kept after the dispatcher for reversing only
+            patterns.insert(0, DictDispatchPattern(patterns))
+        if self.serve_swagger:
+            patterns += [
+                url(r'^swagger\.json$', SwaggerView.as_view(router=self, format='json'), name='swagger_json'),
+                url(r'^swagger\.yaml$', SwaggerView.as_view(router=self, format='yaml'), name='swagger_yaml'),
+            ]
+        if self.batch:
+            patterns.append(url(r'^batch/$', BatchView.as_view(router=self), name='batch'))
+        if self.metrics:
+            patterns.append(url(r'^metrics$', MetricsView.as_view(router=self), name='metrics'))
+        return patterns
+
+    def warm_up(self):
+        """
+        Do everything otherwise done lazily on first requests: load artifact, compile validators
+        and query conversion plans, build url patterns and swagger document.
+        """
+        self.load_artifact()
+        get_codec()
+        for view in self.views():
+            schemas = [response.schema for response in view.spec.responses if response.schema is not None]
+            if isinstance(view.spec.payload, s.Schema) and view.spec.payload is not s.Empty:
+                schemas.append(view.spec.payload)
+            for schema in schemas:
+                if schema._compiled is None:
+                    schema._validator
+                if isinstance(schema, s.Query):
+                    schema._plan
+        self.urls
+        document = self.swagger_document()
+        document.json, document.yaml
+
+    def batch_executor(self):
+        """Pool shared by batch requests to run entries concurrently, None when batch_workers is 1."""
+        if self.batch_workers <= 1:
+            return None
+        if self._batch_executor is None:
+            with self._lock:
+                if self._batch_executor is None:
+                    self._batch_executor = ThreadPoolExecutor(self.batch_workers)
+        return self._batch_executor
+
+    def _swagger_document_key(self):
+        return len(self.views()), len(s.Definition.registered)
+
+    def swagger_document(self) -> SwaggerDocument:
+        """Memoized serialized swagger(), rebuilt only when views or definitions are added."""
+        key = self._swagger_document_key()
+        if self._swagger_key != key:
+            self._swagger_document = SwaggerDocument(self.swagger())
+            self._swagger_key = key
+        return self._swagger_document
+
+    def set_swagger_document(self, document: SwaggerDocument):
+        self._swagger_document = document
+        self._swagger_key = self._swagger_document_key()
 
     def swagger(self):
         data = {
             'swagger': '2.0',
             'basePath': '/api',
             'schemes': ['http'],
-            'consumes': ['application/json'],
-            'produces': ['application/json'],
+            'consumes': content_types(),
+            'produces': content_types(),
             'info': {
                 'title': '',
                 'version': ''
@@ -48,5 +187,5 @@ class Router:
                 }
         }
         if s.Definition.registered:
-            data[s.DEFINITIONS_PATH] = {d.name: d.schema.to_json() for d in s.Definition.registered.values()}
+            data[s.DEFINITIONS_PATH] = dict(s.DEFINITIONS[s.DEFINITIONS_PATH])
         return data
@@ -1,7 +1,12 @@
 import abc
+import itertools
+import json
 import typing
+from urllib.parse import parse_qs
 
 import jsonschema
+from django.core import signing
+from django.core.exceptions import TooManyFieldsSent
 from django.utils.datastructures import MultiValueDict
 from django.utils.functional import cached_property
 
@@ -9,6 +14,11 @@ from .exceptions import ConfigurationError
 
 REF_KEY = '$ref'
 DEFINITIONS_PATH = 'definitions'
+CURSOR_SALT = 'api.schema.Page'
+
+# single document holding json of every registered Definition, shared by all validators
+DEFINITIONS = {DEFINITIONS_PATH: {}}
+_resolver = jsonschema.RefResolver('', DEFINITIONS)
 
 
 class ConvertError(Exception):
@@ -32,6 +42,21 @@ class DataError(Exception):
         return res
 
 
+class _ErrorLimitReached(Exception):
+    pass
+
+
+class _BoundedErrors(list):
+    def __init__(self, limit):
+        super(_BoundedErrors, self).__init__()
+        self.limit = limit
+
+    def append(self, error):
+        super(_BoundedErrors, self).append(error)
+        if len(self) >= self.limit:
+            raise _ErrorLimitReached()
+
+
 class Schema(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def to_json(self):
@@ -39,12 +64,37 @@ class Schema(metaclass=abc.ABCMeta):
 
     @cached_property
     def _validator(self):
-        return jsonschema.Draft4Validator(embed_definitions(self.to_json()))
+        return jsonschema.Draft4Validator(self.to_json(), resolver=_resolver)
 
-    def check_and_return(self, instance):
-        errors = list(sorted(self._validator.iter_errors(instance), key=str))
+    @cached_property
+    def _compiled(self):
+        from .compiler import CompileError, compile_schema
+        try:
+            return compile_schema(self)
+        except CompileError:
+            return None
+
+    def check_and_return(self, instance, max_errors: typing.Optional[int] = None):
+        """
+        Validate instance, raising DataError with errors sorted by their text.
+        With ``max_errors`` set validation stops as soon as that many errors are found.
+        """
+        validate = self._compiled
+        if validate is None:
+            # views reject non-positive max_errors at class creation, here they stop at the first error like below
+            limit = None if max_errors is None else max(max_errors, 1)
+            errors = list(itertools.islice(self._validator.iter_errors(instance), limit))
+        elif max_errors is None:
+            errors = []
+            validate(instance, errors)
+        else:
+            errors = _BoundedErrors(max_errors)
+            try:
+                validate(instance, errors)
+            except _ErrorLimitReached:
+                pass
         if errors:
-            raise DataError(errors)
+            raise DataError(sorted(errors, key=str))
         return instance
 
 
@@ -74,6 +124,7 @@ class Definition(Schema):
             raise ConfigurationError('duplicate definition {}'.format(self.reg_name))
         self.schema = schema
         self.registered[self.reg_name] = self
+        DEFINITIONS[DEFINITIONS_PATH][name] = schema.to_json()
 
     def to_json(self):
         return {REF_KEY: self.reg_name}
@@ -179,47 +230,128 @@ class Query(Object):
     def __init__(self, **properties: typing.Mapping[str, typing.Union[String, Integer, Number, Array, Boolean]]):
         super(Query, self).__init__(**properties)
 
-    def qs_check_and_return(self, instance: MultiValueDict):
-        try:
-            res = {}
-            for key, value in self.properties.items():
-                try:
-                    required = True
-                    if isinstance(value, Optional):
-                        required = False
-                        value = value.schema
-
-                    if not required and key not in instance:
-                        continue
-
-                    if isinstance(value, Array):
-                        res[key] = value.qs_check_and_return(instance.getlist(key))
-                    else:
-                        res[key] = value.qs_check_and_return(instance.get(key))
-
-                except ConvertError as err:
-                    raise jsonschema.ValidationError(message=err.message, path=[key] + err.path)
-            return res
-        except jsonschema.ValidationError as err:
-            raise DataError([err])
-
-def _collect_definitions(data):
+    @cached_property
+    def _plan(self):
+        """Flat ``(key, required, is_array, converter)`` entries, converter is None for plain strings."""
+        plan = []
+        for key, value in self.properties.items():
+            required = True
+            if isinstance(value, Optional):
+                required = False
+                value = value.schema
+            converter = None if type(value) is String else value.qs_check_and_return
+            plan.append((key, required, isinstance(value, Array), converter))
+        return plan
+
+    def qs_check_and_return(self, instance: typing.Union[str, MultiValueDict], encoding: str = 'utf-8',
+                            max_num_fields: typing.Optional[int] = None):
+        """
+        Convert raw query string or parsed MultiValueDict (like request.GET) according to properties.
+        Query string is parsed as QueryDict would: percent escapes decoded with ``encoding``,
+        TooManyFieldsSent raised when it has more than ``max_num_fields`` fields.
+        """
+        if isinstance(instance, str):
+            if max_num_fields is not None and instance.count('&') >= max_num_fields:
+                raise TooManyFieldsSent('The number of GET/POST parameters exceeded '
+                                        'settings.DATA_UPLOAD_MAX_NUMBER_FIELDS.')
+            lists = parse_qs(instance, keep_blank_values=True, encoding=encoding, errors='replace')
+        else:
+            lists = dict(instance.lists())
+
+        res = {}
+        for key, required, is_array, converter in self._plan:
+            values = lists.get(key)
+            if values is None:
+                if not required:
+                    continue
+                values = []
+            value = values if is_array else (values[-1] if values else None)
+            if converter is None:
+                res[key] = value
+                continue
+            try:
+                res[key] = converter(value)
+            except ConvertError as err:
+                raise DataError([jsonschema.ValidationError(message=err.message, path=[key] + err.path)])
+        return res
+
+
+class Page(Object):
+    """
+    Page of ``schema`` items, ``{"items": [...], "next": "<cursor>"}`` with ``next`` left out on the last page.
+    Spec with a Page response gets optional ``cursor`` and ``limit`` query parameters, handler receives
+    decoded cursor (None for the first page) and limit capped at ``max_limit`` and returns ``page(...)``.
+    Cursors are signed with a salt of the view (``cursor_salt``), one view doesn't accept cursors of another.
+    """
+
+    def __init__(self, schema: Schema, max_limit: int = 100, default_limit: int = 20):
+        super(Page, self).__init__(items=Array(schema), next=Optional(String()))
+        if not 0 < default_limit <= max_limit:
+            raise ConfigurationError('Page default_limit must be between 1 and max_limit')
+        self.schema = schema
+        self.max_limit = max_limit
+        self.default_limit = default_limit
+
+    def to_json(self):
+        data = super(Page, self).to_json()
+        data['properties']['items']['maxItems'] = self.max_limit
+        return data
+
+    def check_query(self, data: dict, salt: str = CURSOR_SALT) -> dict:
+        """Replace raw ``cursor`` and ``limit`` of converted query with position and page size."""
+        cursor = data.get('cursor')
+        if cursor is not None:
+            try:
+                cursor = json.loads(signing.b64_decode(signing.Signer(salt=salt).unsign(cursor).encode()).decode())
+            except (signing.BadSignature, ValueError):
+                raise DataError([jsonschema.ValidationError(message='invalid cursor', path=['cursor'])])
+        data['cursor'] = cursor
+        data['limit'] = min(max(data.get('limit', self.default_limit), 1), self.max_limit)
+        return data
+
+    @staticmethod
+    def sign(data, salt: str = CURSOR_SALT):
+        """Replace ``next`` position of ``page(...)`` data with its cursor, signature doesn't expire so it is stable."""
+        if isinstance(data, dict) and data.get('next') is not None:
+            position = signing.b64_encode(json.dumps(data['next'], separators=(',', ':')).encode()).decode()
+            data = dict(data, next=signing.Signer(salt=salt).sign(position))
+        return data
+
+
+def cursor_salt(view_name: str) -> str:
+    return '{}.{}'.format(CURSOR_SALT, view_name)
+
+
+def page(items: typing.List, position=None) -> dict:
+    """
+    Page response data, ``position`` is any json value the handler needs to continue after the last item
+    (e.g. its sort key), None on the last page. The view turns it into an opaque signed cursor.
+    """
+    data = {'items': items}
+    if position is not None:
+        data['next'] = position
+    return data
+
+
+def _collect_definitions(data, res):
     if isinstance(data, dict):
-        res = []
         for key, value in data.items():
             if key == REF_KEY:
-                res.append(Definition.registered[value])
+                if value not in res:
+                    definition = res[value] = Definition.registered[value]
+                    _collect_definitions(DEFINITIONS[DEFINITIONS_PATH][definition.name], res)
             else:
-                res += _collect_definitions(value)
-        return res
+                _collect_definitions(value, res)
     elif isinstance(data, list):
-        return sum(map(_collect_definitions, data), [])
-    return []
+        for value in data:
+            _collect_definitions(value, res)
+    return res
 
 
 def embed_definitions(data):
-    definitions = _collect_definitions(data)
+    """Make a standalone copy of schema json with all (transitively) referenced definitions embedded."""
+    definitions = _collect_definitions(data, {})
     if definitions:
         data = dict(data)
-        data[DEFINITIONS_PATH] = {d.name: d.schema.to_json() for d in definitions}
+        data[DEFINITIONS_PATH] = {d.name: DEFINITIONS[DEFINITIONS_PATH][d.name] for d in definitions.values()}
     return data
@@ -2,7 +2,10 @@ import enum
 import typing
 
 from . import schema as s
+from .cache import ResponseCache
+from .compression import Compression
 from .exceptions import ConfigurationError
+from .limits import ConcurrencyLimit
 
 
 class Method(enum.Enum):
@@ -11,9 +14,12 @@ class Method(enum.Enum):
 
 
 class Response:
-    def __init__(self, code: int, description: typing.Optional[str] = None, schema: typing.Optional[s.Schema] = None):
+    def __init__(self, code: int, description: typing.Optional[str] = None, schema: typing.Optional[s.Schema] = None,
+                 compression: typing.Optional[Compression] = None, headers: typing.Optional[dict] = None):
         self.code = code
         self.schema = schema
+        self.compression = compression
+        self.headers = headers
         if description is None:
             if 200 <= code < 300:
                 description = 'success'
@@ -29,19 +35,69 @@ class Response:
         data = {'description': self.description}
         if self.schema:
             data['schema'] = self.schema.to_json()
+        if self.headers:
+            data['headers'] = self.headers
         return {
             str(self.code): data
         }
 
 
 class Spec:
-    def __init__(self, method: Method, payload: typing.Optional[s.Schema], *responses: typing.List[Response]):
+    """
+    ``fields=True`` adds optional ``fields`` query parameter selecting (comma separated, nested with dots)
+    fields of the first successful response schema, see api.fields.
+    ``limit`` caps concurrent requests of views using the spec, see api.limits.
+    ``coalesce=True`` lets concurrent requests with equal validated query share one handle call
+    and its serialized response, see api.coalesce.
+    """
+
+    def __init__(self, method: Method, payload: typing.Optional[s.Schema], *responses: typing.List[Response],
+                 max_body_size: typing.Optional[int] = None, cache: typing.Optional[ResponseCache] = None,
+                 fields: bool = False, limit: typing.Optional[ConcurrencyLimit] = None, coalesce: bool = False):
         self.method = method
         self.payload = payload
         self.responses = responses
+        self.max_body_size = max_body_size
+        self.cache = cache
+        self.limit = limit
+        self.coalesce = coalesce
+
+        if cache is not None and self.method is not Method.GET:
+            raise ConfigurationError('only GET spec can be cached')
+        if coalesce and self.method is not Method.GET:
+            raise ConfigurationError('only GET spec can be coalesced')
 
         if self.method is Method.GET:
             if payload:
                 if not isinstance(payload, s.Query) and payload is not s.Empty:
                     raise ConfigurationError('GET spec must be api.schema.Query or api.schema.Empty instance, got {}'
                                              .format(type(payload)))
+
+        self.page = None
+        for response in responses:
+            if isinstance(response.schema, s.Page):
+                self.page = response.schema
+        if self.page is not None:
+            if self.method is not Method.GET:
+                raise ConfigurationError('only GET spec can be paginated')
+            self._add_parameters(cursor=s.Optional(s.String()), limit=s.Optional(s.Integer()))
+
+        self.fields_response = None
+        if fields:
+            if self.method is not Method.GET:
+                raise ConfigurationError('only GET spec can have fields')
+            for response in responses:
+                if 200 <= response.code < 300 and response.schema is not None:
+                    self.fields_response = response
+                    break
+            else:
+                raise ConfigurationError('spec with fields must declare successful response with schema')
+            self._add_parameters(fields=s.Optional(s.String()))
+
+    def _add_parameters(self, **parameters):
+        properties = dict(self.payload.properties) if self.payload and self.payload is not s.Empty else {}
+        for name in parameters:
+            if name in properties:
+                raise ConfigurationError('spec query can\'t declare {}, it is added automatically'.format(name))
+        properties.update(parameters)
+        self.payload = s.Query(**properties)
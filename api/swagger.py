@@ -1,11 +1,67 @@
+import functools
+import gzip
 import json
 import os
 
 import jsonschema
+import yaml
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.functional import cached_property
+from django.views import View
 
+from .http import accepts_encoding, etag_matches, make_etag
 
-def validate(spec):
+
+@functools.lru_cache()
+def _swagger_schema():
     schema_path = os.path.join(os.path.dirname(__file__), 'swagger.json')
     with open(schema_path) as fp:
-        schema = json.load(fp)
-    jsonschema.validate(spec, schema)
+        return json.load(fp)
+
+
+def validate(spec):
+    jsonschema.validate(spec, _swagger_schema())
+
+
+class Body:
+    def __init__(self, content: bytes, content_type: str):
+        self.content = content
+        self.content_type = content_type
+        self.etag = make_etag(content)
+        self.gzipped = gzip.compress(content)
+
+
+class SwaggerDocument:
+    """Serialized swagger spec, built once per Router state."""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+    @cached_property
+    def json(self):
+        return Body(json.dumps(self.spec, sort_keys=True).encode('utf-8'), 'application/json')
+
+    @cached_property
+    def yaml(self):
+        return Body(yaml.safe_dump(self.spec).encode('utf-8'), 'application/x-yaml')
+
+
+class SwaggerView(View):
+    router = None
+    format = 'json'
+
+    def get(self, request):
+        body = getattr(self.router.swagger_document(), self.format)
+        gzipped = accepts_encoding(request, 'gzip')
+        # strong etag is of the identity body, gzipped one is only semantically equivalent
+        etag = 'W/' + body.etag if gzipped else body.etag
+        if etag_matches(request, body.etag):
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(body.gzipped, content_type=body.content_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body.content, content_type=body.content_type)
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
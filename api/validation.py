@@ -0,0 +1,132 @@
+import itertools
+import logging
+import queue
+import random
+import threading
+
+from . import schema as s
+
+__all__ = ('ResponseValidation', 'Always', 'Never', 'Sampled', 'FirstItems', 'Background',)
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_items(schema, items):
+    for idx, item in enumerate(items):
+        try:
+            schema.check_and_return(item)
+        except s.DataError as err:
+            for error in err.errors:
+                error.path.appendleft(idx)
+            raise
+        yield item
+
+
+class ResponseValidation:
+    """
+    Response contract validation policy.
+    ``validate`` returns data to be sent or raises api.schema.DataError,
+    ``validate_items`` wraps an iterator of streamed array items, raising DataError when an item is invalid.
+    """
+
+    def validate(self, view, schema: s.Schema, data):
+        return schema.check_and_return(data)
+
+    def validate_items(self, view, schema: s.Schema, items):
+        return _validate_items(schema, items)
+
+
+class Always(ResponseValidation):
+    pass
+
+
+class Never(ResponseValidation):
+    def validate(self, view, schema, data):
+        return data
+
+    def validate_items(self, view, schema, items):
+        return items
+
+
+class Sampled(ResponseValidation):
+    def __init__(self, rate: float, policy: ResponseValidation = None):
+        self.rate = rate
+        self.policy = policy or Always()
+
+    def validate(self, view, schema, data):
+        if random.random() < self.rate:
+            return self.policy.validate(view, schema, data)
+        return data
+
+    def validate_items(self, view, schema, items):
+        if random.random() < self.rate:
+            return self.policy.validate_items(view, schema, items)
+        return items
+
+
+class FirstItems(ResponseValidation):
+    def __init__(self, count: int):
+        self.count = count
+
+    def validate(self, view, schema, data):
+        if isinstance(schema, s.Array) and isinstance(data, list) and len(data) > self.count:
+            schema.check_and_return(data[:self.count])
+            return data
+        return schema.check_and_return(data)
+
+    def validate_items(self, view, schema, items):
+        yield from _validate_items(schema, itertools.islice(items, self.count))
+        yield from items
+
+
+class Background(ResponseValidation):
+    """
+    Validates responses in a worker thread after they are sent, violations are only logged and counted.
+    Responses are skipped (and counted as dropped) while ``max_pending`` of them are waiting for validation.
+    """
+
+    def __init__(self, max_pending: int = 1000, policy: ResponseValidation = None):
+        self.policy = policy or Always()
+        self.checked = 0
+        self.violations = 0
+        self.dropped = 0
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def validate(self, view, schema, data):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='api-response-validation', daemon=True)
+                    self._worker.start()
+        try:
+            self._queue.put_nowait((view.__class__.__name__, schema, data))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+        return data
+
+    def validate_items(self, view, schema, items):
+        for item in items:
+            yield self.validate(view, schema, item)
+
+    def join(self):
+        """Wait until every queued response is validated."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            name, schema, data = self._queue.get()
+            try:
+                self.policy.validate(None, schema, data)
+            except s.DataError as err:
+                with self._lock:
+                    self.violations += 1
+                logger.error('{} failed background schema validation: {}'.format(name, err.as_dict()))
+            except Exception:
+                logger.exception('{} background schema validation crashed'.format(name))
+            finally:
+                with self._lock:
+                    self.checked += 1
+                self._queue.task_done()
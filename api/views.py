@@ -1,21 +1,57 @@
-import json
+import asyncio
+import collections.abc
+import functools
 import logging
+import time
+import types
 import typing
 
+import django
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
 from django.utils.module_loading import import_string
 from django.views import View
 
 from . import schema as s
-from .exceptions import ConfigurationError, MethodNotAllowed, RequestParseError, RequestContractError, \
-    ResponseContractError
-from .spec import Spec, Method
-
-__all__ = ('Method', 'ApiView',)
+from . import fields, profiling, validation
+from .cache import CachedResponse, query_digest, view_name
+from .coalesce import SingleFlight
+from .codec import JSON_CONTENT_TYPE, accept_types, codec_for, content_types, get_codec
+from .compression import Compression
+from .exceptions import ConfigurationError, MethodNotAllowed, RequestEntityTooLarge, RequestParseError, \
+    RequestContractError, ResponseContractError
+from .http import etag_matches, make_etag, negotiate
+from .limits import ConcurrencyLimit
+from .metrics import SIZE_BUCKETS, ViewStats
+from .parsing import BodyTooLarge, query_string, read_body
+from .spec import Response, Spec, Method
+
+__all__ = ('Method', 'ApiView', 'registry',)
 
 logger = logging.getLogger(__name__)
 
+_ALWAYS = validation.Always()
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# every concrete view in definition order, whatever its base, routers index it by view.router
+registry = []
+
+PHASES = ('parse', 'request_validation', 'handle', 'response_validation', 'serialize')
+_PHASE_METRICS = {phase: 'phase_seconds{{phase="{}"}}'.format(phase) for phase in PHASES}
+_CONTRACT_FAILURES = (RequestParseError, RequestContractError, RequestEntityTooLarge, ResponseContractError)
+
+
+@functools.lru_cache()
+def _import_instance(path):
+    instance = import_string(path)
+    if isinstance(instance, type):
+        instance = instance()
+    return instance
+
 
 class StaticProperty:
     def __init__(self, getter):
@@ -72,7 +108,27 @@ class ApiViewMeta(type):
 
         cls = type.__new__(mcs, name, bases, attrs)
         if not cls.abstract:
-            cls.swagger_spec = SwaggerSpec(name, cls.spec, cls.__doc__)
+            limit = cls.concurrency_limit or cls.spec.limit
+            cls.swagger_spec = SwaggerSpec(name, cls.spec, cls.__doc__, limit)
+            cls.is_async = asyncio.iscoroutinefunction(cls.handle)
+            cls.stats = ViewStats(name)
+            if limit is not None:
+                cls.stats.gauge('in_flight', lambda: limit.in_flight)
+                cls.stats.gauge('queued', lambda: limit.queued)
+            max_errors = cls.max_errors if cls.max_errors is not None else getattr(settings, 'API_MAX_ERRORS', None)
+            if max_errors is not None and max_errors < 1:
+                raise ConfigurationError('{} max_errors must be positive, got {}'.format(name, max_errors))
+            if cls.response_cache is not None and cls.spec.method is not Method.GET:
+                raise ConfigurationError('{} isn\'t GET view, it can\'t be cached'.format(name))
+            coalesce = cls.spec.coalesce if cls.coalesce is None else cls.coalesce
+            cls.single_flight = None
+            if coalesce:
+                if cls.spec.method is not Method.GET:
+                    raise ConfigurationError('{} isn\'t GET view, it can\'t be coalesced'.format(name))
+                cls.single_flight = SingleFlight()
+                cls.stats.gauge('coalesce_waiting', lambda: cls.single_flight.waiting)
+            profiling.configure(cls)
+            registry.append(cls)
         return cls
 
 
@@ -80,18 +136,26 @@ class ApiConfig:
     abstract = False
     router = None
     spec = None
+    max_errors = None
+    response_validation = None
+    response_cache = None
+    etag = False
+    compression = None
+    concurrency_limit = None
+    coalesce = None
 
     def handle(self, data):
         pass  # pragma: no cover
 
 
 class SwaggerSpec:
-    def __init__(self, name: str, spec: Spec, description: str = None):
+    def __init__(self, name: str, spec: Spec, description: str = None, limit: ConcurrencyLimit = None):
         self.name = name
         self.description = description or ''
         if self.name.lower().endswith('view'):
             self.name = self.name[:-4]
         self._spec = spec
+        self._limit = limit
 
     @property
     def spec(self):
@@ -121,46 +185,300 @@ class SwaggerSpec:
                         'name': name,
                         'required': required
                     }))
+                for parameter in data['parameters']:
+                    if parameter['name'] == 'fields' and self._spec.fields_response is not None:
+                        parameter['description'] = 'comma separated response fields, nested ones joined with dots'
+                if self._spec.page is not None:
+                    for parameter in data['parameters']:
+                        if parameter['name'] == 'cursor':
+                            parameter['description'] = 'opaque cursor from "next" of the previous page'
+                        elif parameter['name'] == 'limit':
+                            parameter.update(description='page size', minimum=1,
+                                             maximum=self._spec.page.max_limit, default=self._spec.page.default_limit)
 
         for response in self._spec.responses:
             data['responses'].update(response.swagger())
+        if self._limit is not None and str(self._limit.status) not in data['responses']:
+            data['responses'].update(Response(self._limit.status, 'too many concurrent requests', headers={
+                'Retry-After': {'type': 'integer', 'description': 'seconds to wait before retrying'}
+            }).swagger())
 
         return {self._spec.method.value.lower(): data}
 
 
 class ApiView(View, ApiConfig, metaclass=ApiViewMeta):
     abstract = True
-
-    def _handle(self, data: typing.Optional[str]):
-        if not data:
-            data = None
-
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)
-            except json.JSONDecodeError:
-                return RequestParseError()
+    is_async = False
+    max_errors = None
+    response_validation = None
+    response_cache = None
+    etag = False
+    compression = None
+    concurrency_limit = None
+    coalesce = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super(ApiView, cls).as_view(**initkwargs)
+        if not cls.is_async:
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        functools.update_wrapper(async_view, view)
+        if django.VERSION < (3, 1):
+            # no native async views, run the event loop in the request thread
+            from asgiref.sync import async_to_sync
+            return functools.update_wrapper(async_to_sync(async_view), view)
+        return async_view
+
+    def _handle(self, data: typing.Union[None, str, bytes]):
+        if self.is_async:
+            return self._ahandle(data)
+
+        limit = self.get_concurrency_limit()
+        if limit is None:
+            return self._run(data)
+        if not limit.acquire():
+            return self._shed(limit)
+        try:
+            response = self._run(data)
+        except BaseException:
+            limit.release()
+            raise
+        return self._hold(limit, response)
+
+    async def _ahandle(self, data: typing.Union[None, str, bytes]):
+        limit = self.get_concurrency_limit()
+        if limit is None:
+            return await self._arun(data)
+        if not await limit.aacquire():
+            return self._shed(limit)
+        try:
+            response = await self._arun(data)
+        except BaseException:
+            limit.release()
+            raise
+        return self._hold(limit, response)
+
+    @staticmethod
+    def _hold(limit: ConcurrencyLimit, response: HttpResponseBase) -> HttpResponseBase:
+        """Release the slot now or, for a streamed body generated later, once the server closes the response."""
+        if not response.streaming:
+            limit.release()
+            return response
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                limit.release()
+
+        closers = getattr(response, '_resource_closers', None)
+        if closers is not None:
+            closers.append(release)
+        else:
+            # django < 3.0 closes objects instead of calling callbacks
+            response._closable_objects.append(types.SimpleNamespace(close=release))
+        return response
+
+    def _run(self, data):
+        response, data = self._prepare(data)
+        if response is None:
+            if self.single_flight is not None:
+                shared = self.single_flight.do(self._flight_key(data), functools.partial(self._execute, data))
+                return self._record(self._share(*shared))
+            response = self._finalize(*self._execute(data))
+        return self._record(response)
+
+    async def _arun(self, data):
+        response, data = self._prepare(data)
+        if response is None:
+            if self.single_flight is not None:
+                shared = await self.single_flight.ado(self._flight_key(data), functools.partial(self._aexecute, data))
+                return self._record(self._share(*shared))
+            response = self._finalize(*(await self._aexecute(data)))
+        return self._record(response)
+
+    def _execute(self, data):
+        start = time.perf_counter()
+        result = self.handle(data)
+        self._observe('handle', start)
+        return self._complete(result)
+
+    async def _aexecute(self, data):
+        start = time.perf_counter()
+        result = await self.handle(data)
+        self._observe('handle', start)
+        return self._complete(result)
+
+    def _flight_key(self, data) -> str:
+        return '{}:{}'.format(query_digest(data), self._codec.name)
+
+    def _share(self, result, leader: bool):
+        """Response of a coalesced request, followers get a copy of the leader's serialized response."""
+        response, cached = result
+        if leader:
+            return self._finalize(response, cached)
+        self.stats.incr('coalesced')
+        return self._finalize(cached.response(), cached)
+
+    def _shed(self, limit: ConcurrencyLimit):
+        self.stats.incr('shed')
+        return self._record(limit.response())
+
+    def _observe(self, phase: str, start: float):
+        self.stats.observe(_PHASE_METRICS[phase], time.perf_counter() - start)
+
+    def _record(self, response: HttpResponseBase) -> HttpResponseBase:
+        if isinstance(response, _CONTRACT_FAILURES):
+            self.stats.incr('contract_failures{{status="{}"}}'.format(response.status_code))
+        if not response.streaming:
+            self.stats.observe('response_bytes', len(response.content), SIZE_BUCKETS)
+        return response
+
+    def _prepare(self, data):
+        """Everything up to calling handle, returns ``(early response, None)`` or ``(None, handler data)``."""
+        error, data = self._check_request(data)
+        if error is not None:
+            return error, None
+
+        self._fields = data.get('fields') if self.spec.fields_response is not None else None
+        self._codec = codec_for(negotiate(self.request, accept_types()))
+        self._etag = None
+        if self.spec.method is Method.GET:
+            self._etag = self.get_etag(data)
+            if self._etag is not None and etag_matches(self.request, self._etag):
+                return self._not_modified(self._etag), None
+
+        self._cache = self.get_response_cache()
+        if self._cache is not None:
+            self._cache_key = self._cache.key(view_name(self.__class__), data, self._codec.name)
+            cached = self._cache.get(self._cache_key)
+            if cached is not None:
+                return self._finalize(cached.response(), cached), None
+
+        return None, data
+
+    def _complete(self, result):
+        """
+        Everything after handle returned up to what differs between requests with equal query,
+        returns the response and its cache entry. Coalesced responses always get an entry to share,
+        with no conditional answer or streaming, those depend on the request or can't be replayed.
+        """
+        status_code, response_data, etag = self._unpack(result)
+        response = self._respond(status_code, response_data, etag or self._etag)
+        cached = None
+        if self._cache is not None:
+            cached = self._cache.set(self._cache_key, response)
+        if cached is None and self.single_flight is not None:
+            cached = CachedResponse.from_response(response)
+        return response, cached
+
+    def _finalize(self, response: HttpResponseBase, cached: typing.Optional[CachedResponse] = None):
+        """Conditional GET, content negotiation headers and compression of a fresh or cached response."""
+        response = self._conditional(response)
+        if len(content_types()) > 1:
+            patch_vary_headers(response, ('Accept',))
+        return self._compress(response, cached)
+
+    def _conditional(self, response: HttpResponseBase) -> HttpResponseBase:
+        if self.spec.method is Method.GET and 200 <= response.status_code < 300 and response.has_header('ETag'):
+            etag = response['ETag']
+            if etag_matches(self.request, etag):
+                return self._not_modified(etag)
+        return response
+
+    def _compress(self, response: HttpResponseBase, cached: typing.Optional[CachedResponse] = None):
+        """Apply compression policy, reusing compressed content stored on cache entry."""
+        compression = self.get_compression(response.status_code)
+        if compression is None or response.streaming or response.has_header('Content-Encoding'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        content = response.content
+        if len(content) < compression.min_size:
+            return response
+        encoding = compression.negotiate(self.request)
+        if encoding is None:
+            return response
+
+        compressed = cached.compressed.get(encoding) if cached is not None else None
+        if compressed is None:
+            compressed, cpu_time = compression.compress(content, encoding)
+            self.stats.incr('compression_input_bytes', len(content))
+            self.stats.incr('compression_output_bytes', len(compressed))
+            self.stats.incr('compression_cpu_us', int(cpu_time * 1e6))
+            if cached is not None:
+                cached.compressed[encoding] = compressed
+                if self._cache is not None:
+                    self._cache.update(self._cache_key, cached)
+        response.content = compressed
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag') and not response['ETag'].startswith('W/'):
+            # representation changed, strong etag of the plain body no longer holds
+            response['ETag'] = 'W/' + response['ETag']
+        return response
+
+    def _not_modified(self, etag: str):
+        self.stats.incr('not_modified')
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    def _check_request(self, data):
+        """Parse and validate payload, returning ``(error response, None)`` or ``(None, handler data)``."""
+        codec = get_codec()
+        if isinstance(data, (str, bytes)):
+            self.stats.observe('request_bytes', len(data), SIZE_BUCKETS)
+            if self.spec.method is Method.POST:
+                start = time.perf_counter()
+                try:
+                    data = self._request_codec().loads(data) if data else None
+                except ValueError:
+                    return RequestParseError(), None
+                self._observe('parse', start)
 
         if not self.spec.payload or self.spec.payload is s.Empty:
             if data:
-                return RequestContractError()
+                return RequestContractError(), None
         else:
+            start = time.perf_counter()
             try:
                 if self.spec.method is Method.GET:
-                    data = self.spec.payload.qs_check_and_return(data)
+                    data = self.spec.payload.qs_check_and_return(
+                        data, self.request.encoding or settings.DEFAULT_CHARSET,
+                        settings.DATA_UPLOAD_MAX_NUMBER_FIELDS)
+                    if self.spec.page is not None:
+                        data = self.spec.page.check_query(data, s.cursor_salt(self.__class__.__name__))
+                    if self.spec.fields_response is not None:
+                        data['fields'] = fields.parse_fields(data.get('fields'), self.spec.fields_response.schema)
                 else:
-                    data = self.spec.payload.check_and_return(data)
+                    data = self.spec.payload.check_and_return(data, max_errors=self.get_max_errors())
             except s.DataError as err:
-                return RequestContractError(json.dumps(err.as_dict()), content_type='application/json')
+                return RequestContractError(codec.dumps(err.as_dict()), content_type='application/json'), None
+            self._observe('request_validation', start)
+
+        return None, data
 
+    @staticmethod
+    def _unpack(response_data):
         status_code = 200
-        response_data = self.handle(data)
+        etag = None
         if isinstance(response_data, int):
             status_code = response_data
             response_data = None
         elif isinstance(response_data, tuple):
-            status_code, response_data = response_data
+            if len(response_data) == 3:
+                status_code, response_data, etag = response_data
+            else:
+                status_code, response_data = response_data
+        return status_code, response_data, etag
 
+    def _respond(self, status_code: int, response_data, etag: typing.Optional[str] = None):
         for response in self.spec.responses:
             if response.code == status_code:
                 if response.schema and not response_data:
@@ -174,27 +492,153 @@ class ApiView(View, ApiConfig, metaclass=ApiViewMeta):
                 elif not response.schema and not response_data:
                     return HttpResponse(status=status_code)
 
+                if etag is not None and self.spec.method is Method.GET and self.single_flight is None \
+                        and etag_matches(self.request, etag):
+                    # client already has it, skip validation and serialization
+                    return self._not_modified(etag)
+
+                schema = response.schema
+                if schema is self.spec.page:
+                    response_data = schema.sign(response_data, s.cursor_salt(self.__class__.__name__))
+                if self._fields is not None and response is self.spec.fields_response:
+                    schema = fields.project_schema(schema, self._fields)
+                    response_data = fields.project(response.schema, response_data, self._fields)
+
+                codec = self._codec
+                if isinstance(schema, s.Array) and isinstance(response_data, collections.abc.Iterator):
+                    if codec.content_type != JSON_CONTENT_TYPE or self.single_flight is not None:
+                        # only json is streamed, other formats need item count upfront,
+                        # coalesced response is shared
+                        response_data = list(response_data)
+                    else:
+                        return StreamingHttpResponse(self._stream(schema, response_data, status_code),
+                                                     status=status_code, content_type=JSON_CONTENT_TYPE)
+
+                start = time.perf_counter()
                 try:
-                    response_data = response.schema.check_and_return(response_data)
+                    response_data = self.get_response_validation().validate(self, schema, response_data)
                 except s.DataError as err:
                     logger.error('{} failed schema validation for response {}: {}'.format(
                         self.__class__.__name__, status_code, err
                     ))
                     return ResponseContractError()
-
-                return JsonResponse(response_data, status=status_code, safe=False)
+                self._observe('response_validation', start)
+
+                start = time.perf_counter()
+                content = codec.dumps(response_data)
+                self._observe('serialize', start)
+                if etag is None and self.etag:
+                    etag = make_etag(content)
+                http_response = HttpResponse(content, status=status_code, content_type=codec.content_type)
+                if etag is not None:
+                    http_response['ETag'] = etag
+                return http_response
 
         logger.error('{} defines no response with status {}'.format(self.__class__.__name__, status_code))
         return ResponseContractError()
 
+    def _stream(self, schema: s.Array, items: typing.Iterator, status_code: int):
+        """Encode (and validate) array items one by one, joining them into chunks of about STREAM_CHUNK_SIZE."""
+        dumps = get_codec().dumps
+        items = self.get_response_validation().validate_items(self, schema.schema, items)
+        chunk = [b'[']
+        size = 0
+        try:
+            for idx, item in enumerate(items):
+                data = dumps(item)
+                if idx:
+                    chunk.append(b',')
+                chunk.append(data)
+                size += len(data)
+                if size >= STREAM_CHUNK_SIZE:
+                    yield b''.join(chunk)
+                    chunk = []
+                    size = 0
+        except s.DataError as err:
+            # headers are already sent, truncated body is the only way left to signal failure
+            logger.error('{} failed schema validation for streamed response {}: {}'.format(
+                self.__class__.__name__, status_code, err
+            ))
+            self.stats.incr('contract_failures{status="500"}')
+            if chunk:
+                yield b''.join(chunk)
+            return
+        chunk.append(b']')
+        yield b''.join(chunk)
+
+    def _request_codec(self):
+        return codec_for(self.request.content_type) or get_codec()
+
+    def get_max_errors(self):
+        if self.max_errors is not None:
+            return self.max_errors
+        return getattr(settings, 'API_MAX_ERRORS', None)
+
+    def get_response_validation(self) -> validation.ResponseValidation:
+        if self.response_validation is not None:
+            return self.response_validation
+        policy = getattr(settings, 'API_RESPONSE_VALIDATION', None)
+        if policy is None:
+            return _ALWAYS
+        if isinstance(policy, str):
+            return _import_instance(policy)
+        return policy
+
+    def get_etag(self, data) -> typing.Optional[str]:
+        """
+        Override to provide ETag of the response to validated data without calling handle,
+        matching If-None-Match is answered with 304 right away.
+        """
+        return None
+
+    def get_compression(self, status_code: int) -> typing.Optional[Compression]:
+        for response in self.spec.responses:
+            if response.code == status_code and response.compression is not None:
+                return response.compression
+        if self.compression is not None:
+            return self.compression
+        compression = getattr(settings, 'API_COMPRESSION', None)
+        if isinstance(compression, str):
+            return _import_instance(compression)
+        return compression
+
+    def get_concurrency_limit(self) -> typing.Optional[ConcurrencyLimit]:
+        if self.concurrency_limit is not None:
+            return self.concurrency_limit
+        return self.spec.limit
+
+    @classmethod
+    def get_response_cache(cls):
+        if cls.response_cache is not None:
+            return cls.response_cache
+        return cls.spec.cache
+
+    def get_max_body_size(self):
+        if self.spec.max_body_size is not None:
+            return self.spec.max_body_size
+        return getattr(settings, 'API_MAX_BODY_SIZE', None)
+
     def get(self, request):
         if self.spec.method != Method.GET:
             return MethodNotAllowed(['GET'])
-        return self._handle(request.GET)
+        return self._handle(query_string(request))
 
     def post(self, request):
         if self.spec.method != Method.POST:
             return MethodNotAllowed(['POST'])
-        if 'json' in request.content_type:
-            return self._handle(request.body.decode('utf-8'))
+        limit = self.get_max_body_size()
+        if limit is not None:
+            try:
+                if int(request.META.get('CONTENT_LENGTH') or 0) > limit:
+                    return self._record(RequestEntityTooLarge())
+            except ValueError:
+                return self._record(RequestParseError())
+        if 'json' in request.content_type or codec_for(request.content_type) is not None:
+            if limit is None:
+                return self._handle(request.body)
+            try:
+                body = read_body(request, limit)
+            except BodyTooLarge:
+                return self._record(RequestEntityTooLarge())
+            return self._handle(body)
         return self._handle(request.POST.get('q', '{}'))
@@ -0,0 +1,37 @@
+import os
+import time
+import tracemalloc
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+    django.setup()
+
+
+def measure(func, duration=1.0):
+    """Run func repeatedly for about ``duration`` seconds, return calls per second."""
+    func()
+    calls = 0
+    batch = 1
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            func()
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return calls / elapsed
+        batch *= 2
+
+
+def peak_memory(func):
+    """Peak size in bytes of memory allocated by a single func call."""
+    func()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,46 @@
+"""
+Request/response throughput of ApiView for every installed API_JSON_BACKEND.
+
+    python -m benchmarks.codec
+"""
+import json
+
+from . import measure, setup
+
+
+def main():
+    setup()
+
+    from django.test import RequestFactory, override_settings
+
+    from api.codec import BACKENDS
+    from test_project.api import EchoView, SchemaView
+
+    factory = RequestFactory()
+    echo = EchoView.as_view()
+    schema = SchemaView.as_view()
+    small = json.dumps({'foo': 'bar', 'bar': 1.5, 'spam': {'eggs': 'ham'}})
+    large = json.dumps({'rows': [{'id': idx, 'name': 'row {}'.format(idx), 'tags': ['a', 'b'], 'score': idx / 3}
+                                 for idx in range(5000)]})
+    cases = [
+        ('schema small', schema, small),
+        ('echo large', echo, large),
+    ]
+
+    print('{:10} {:15} {:>12}'.format('backend', 'case', 'req/s'))
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            print('{:10} not installed'.format(name))
+            continue
+        with override_settings(API_JSON_BACKEND=name):
+            for case, view, body in cases:
+                def call():
+                    response = view(factory.post('/', body, content_type='application/json'))
+                    assert response.status_code == 200, response.status_code
+                print('{:10} {:15} {:12.1f}'.format(name, case, measure(call)))
+
+
+if __name__ == '__main__':
+    main()
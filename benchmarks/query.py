@@ -0,0 +1,54 @@
+"""
+Per-request cost of s.Query conversion, from a parsed QueryDict and from the raw query string.
+
+    python -m benchmarks.query
+"""
+from urllib.parse import urlencode
+
+from . import measure, setup
+
+
+def main():
+    setup()
+
+    from django.http import QueryDict
+
+    import api.schema as s
+
+    narrow = s.Query(
+        foo=s.String(),
+        bar=s.Optional(s.Integer())
+    )
+    wide = s.Query(**dict(
+        {'s{}'.format(idx): s.String() for idx in range(10)},
+        **{'n{}'.format(idx): s.Optional(s.Number()) for idx in range(10)},
+        **{'i{}'.format(idx): s.Integer() for idx in range(5)},
+        **{'a{}'.format(idx): s.Optional(s.Array(s.Integer())) for idx in range(5)},
+        flag=s.Boolean()
+    ))
+    wide_query = urlencode(dict(
+        {'s{}'.format(idx): 'value' for idx in range(10)},
+        **{'n{}'.format(idx): '1.5' for idx in range(0, 10, 2)},
+        **{'i{}'.format(idx): str(idx) for idx in range(5)},
+        **{'a{}'.format(idx): ['1', '2', '3'] for idx in range(0, 5, 2)},
+        flag='true'
+    ), doseq=True)
+    cases = [
+        ('narrow', narrow, 'foo=bar&bar=1'),
+        ('wide', wide, wide_query),
+    ]
+
+    print('{:8} {:22} {:>12}'.format('case', 'input', 'ops/s'))
+    for name, schema, query in cases:
+        print('{:8} {:22} {:12.1f}'.format(
+            name, 'QueryDict(query)', measure(lambda: schema.qs_check_and_return(QueryDict(query)))))
+        try:
+            schema.qs_check_and_return(query)
+        except AttributeError:
+            continue
+        print('{:8} {:22} {:12.1f}'.format(
+            name, 'raw query string', measure(lambda: schema.qs_check_and_return(query))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Throughput and peak memory of schema validation, query conversion and swagger generation
+on synthetic schemas, optionally checked against a baseline saved by an earlier run.
+
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --compare baseline.json --tolerance 0.2
+
+Compare mode exits with status 1 when a case gets slower or allocates more than ``tolerance``
+relative to the baseline. Baselines are machine specific, save one on the machine that compares.
+"""
+import argparse
+import json
+import sys
+from urllib.parse import urlencode
+
+from . import measure, peak_memory, setup
+
+
+def nested_schema(s, depth):
+    schema = s.Object(value=s.String(), count=s.Integer())
+    for level in range(depth):
+        schema = s.Object(
+            name=s.String(),
+            score=s.Optional(s.Number()),
+            tags=s.Array(s.String()),
+            child=schema
+        )
+    return schema
+
+
+def nested_instance(depth):
+    instance = {'value': 'leaf', 'count': 1}
+    for level in range(depth):
+        instance = {'name': 'level {}'.format(level), 'score': level / 3, 'tags': ['a', 'b'], 'child': instance}
+    return instance
+
+
+def definitions(s, count):
+    """Chain of ``count`` definitions, each referencing the previous one."""
+    previous = s.Definition('BenchLeaf', s.Object(id=s.Integer(), name=s.String()))
+    chain = [previous]
+    for idx in range(count - 1):
+        previous = s.Definition('BenchDefinition{}'.format(idx), s.Object(
+            id=s.Integer(),
+            items=s.Array(previous),
+            parent=s.Optional(previous)
+        ))
+        chain.append(previous)
+    return chain
+
+
+def cases():
+    import api.schema as s
+    from api.router import Router
+    from api.spec import Response, Spec
+    from api.views import ApiView, Method
+
+    nested = nested_schema(s, 8)
+    nested_data = nested_instance(8)
+
+    row = s.Object(
+        id=s.Integer(),
+        name=s.String(),
+        active=s.Boolean(),
+        score=s.Number(),
+        tags=s.Array(s.String()),
+        parent=s.Optional(s.Null())
+    )
+    rows = s.Array(row)
+    rows_data = [{'id': idx, 'name': 'row {}'.format(idx), 'active': bool(idx % 2), 'score': idx / 7,
+                  'tags': ['a', 'b', 'c'], 'parent': None} for idx in range(1000)]
+
+    chain = definitions(s, 50)
+    referencing = s.Object(root=chain[-1], leaves=s.Array(chain[0]))
+    referencing_data = {'root': {'id': 1, 'items': [{'id': 2, 'items': []}]}, 'leaves': [{'id': 3, 'name': 'x'}]}
+
+    wide = s.Query(**dict(
+        {'s{}'.format(idx): s.String() for idx in range(20)},
+        **{'n{}'.format(idx): s.Optional(s.Number()) for idx in range(20)},
+        **{'i{}'.format(idx): s.Integer() for idx in range(10)},
+        **{'a{}'.format(idx): s.Optional(s.Array(s.Integer())) for idx in range(10)},
+        flag=s.Boolean()
+    ))
+    wide_query = urlencode(dict(
+        {'s{}'.format(idx): 'value' for idx in range(20)},
+        **{'n{}'.format(idx): '1.5' for idx in range(0, 20, 2)},
+        **{'i{}'.format(idx): str(idx) for idx in range(10)},
+        **{'a{}'.format(idx): ['1', '2', '3'] for idx in range(0, 10, 2)},
+        flag='true'
+    ), doseq=True)
+
+    router = Router('bench')
+    for idx in range(100):
+        type('Bench{}View'.format(idx), (ApiView,), {
+            'router': router,
+            'spec': Spec(
+                Method.POST if idx % 2 else Method.GET,
+                wide if idx % 2 == 0 else referencing,
+                Response(200, schema=rows if idx % 3 else nested),
+                Response(404)
+            ),
+            'handle': lambda self, data: data,
+        })
+
+    return [
+        ('check_and_return nested', lambda: nested.check_and_return(nested_data)),
+        ('check_and_return array', lambda: rows.check_and_return(rows_data)),
+        ('check_and_return definitions', lambda: referencing.check_and_return(referencing_data)),
+        ('qs_check_and_return wide', lambda: wide.qs_check_and_return(wide_query)),
+        ('embed_definitions', lambda: s.embed_definitions(referencing.to_json())),
+        ('Router.swagger', router.swagger),
+    ]
+
+
+def run(duration):
+    results = {}
+    for name, func in cases():
+        results[name] = {'ops': measure(func, duration), 'peak': peak_memory(func)}
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    failed = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['ops'] < base['ops'] * (1 - tolerance):
+            failed.append('{}: {:.1f} ops/s, baseline {:.1f}'.format(name, result['ops'], base['ops']))
+        if result['peak'] > base['peak'] * (1 + tolerance):
+            failed.append('{}: {} peak bytes, baseline {}'.format(name, result['peak'], base['peak']))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds per case')
+    parser.add_argument('--save', metavar='FILE', help='write results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='fail on regression against a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    setup()
+    results = run(args.duration)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+
+    print('{:30} {:>12} {:>12} {:>12}'.format('case', 'ops/s', 'peak KiB', 'baseline'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        print('{:30} {:12.1f} {:12.1f} {:>12}'.format(
+            name, result['ops'], result['peak'] / 1024,
+            '{:+.1%}'.format(result['ops'] / base['ops'] - 1) if base else ''))
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        failed = regressions(results, baseline, args.tolerance)
+        for line in failed:
+            print('REGRESSION ' + line, file=sys.stderr)
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,10 +8,14 @@ setup(
     author_email='barbuzaster@gmail.com',
     url='https://github.com/barbuza/api',
     include_package_data=True,
-    packages=find_packages(exclude=['test_project']),
+    packages=find_packages(exclude=['test_project', 'benchmarks']),
     install_requires=[
         'Django >= 1.10',
         'jsonschema >= 2.5.1',
         'PyYAML >= 3.12'
-    ]
+    ],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    }
 )
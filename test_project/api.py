@@ -1,9 +1,17 @@
+import asyncio
+import threading
+import time
+
 import api.schema as s
+from api.cache import ResponseCache
+from api.compression import Compression
+from api.limits import ConcurrencyLimit
 from api.router import Router
 from api.spec import Spec, Response
+from api.validation import Background, FirstItems, Sampled
 from api.views import ApiView, Method
 
-router = Router()
+router = Router(batch=True, batch_workers=4, metrics=True, swagger=True)
 
 
 class GetMethod(ApiView):
@@ -149,3 +157,311 @@ class ForbiddenView(ApiView):
 
     def handle(self, data):
         return 403
+
+
+class BoundedErrorsView(ApiView):
+    max_errors = 2
+
+    spec = Spec(
+        Method.POST,
+        s.Array(s.Object(
+            foo=s.String()
+        )),
+        Response(204)
+    )
+
+    def handle(self, data):
+        return 204  # pragma: no cover
+
+
+broken_items_spec = Spec(
+    Method.GET,
+    s.Empty,
+    Response(200, schema=s.Array(s.Integer()))
+)
+
+
+class SampledValidationView(ApiView):
+    response_validation = Sampled(0)
+    spec = broken_items_spec
+
+    def handle(self, data):
+        return [1, 'two']
+
+
+class FirstItemsValidationView(ApiView):
+    response_validation = FirstItems(1)
+    spec = broken_items_spec
+
+    def handle(self, data):
+        return [1, 'two']
+
+
+class BackgroundValidationView(ApiView):
+    response_validation = Background()
+    spec = broken_items_spec
+
+    def handle(self, data):
+        return [1, 'two']
+
+
+class StreamView(ApiView):
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            count=s.Integer(),
+            fail=s.Boolean()
+        ),
+        Response(200, schema=s.Array(s.Object(
+            id=s.Integer()
+        )))
+    )
+
+    def handle(self, data):
+        for idx in range(data['count']):
+            yield {'id': idx}
+        if data['fail']:
+            yield {'id': 'fail'}
+
+
+class LimitedBodyView(ApiView):
+    spec = Spec(
+        Method.POST,
+        s.Object(),
+        Response(200, schema=s.Object()),
+        max_body_size=64
+    )
+
+    def handle(self, data):
+        return data
+
+
+class AsyncView(ApiView):
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            result=s.String()
+        ),
+        Response(204),
+        Response(200, schema=s.Object(
+            result=s.String()
+        ))
+    )
+
+    async def handle(self, data):
+        await asyncio.sleep(0)
+        if data['result'] == 'int':
+            return 204
+        elif data['result'] == 'fail':
+            return 200, {'result': 1}
+        return data
+
+
+class CachedView(ApiView):
+    etag = True
+    calls = 0
+
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            value=s.Integer(),
+            flags=s.Optional(s.Array(s.String()))
+        ),
+        Response(200, schema=s.Object(
+            value=s.Integer(),
+            calls=s.Integer()
+        )),
+        Response(404),
+        cache=ResponseCache(ttl=60, max_entries=2, tags=['cached'])
+    )
+
+    def handle(self, data):
+        CachedView.calls += 1
+        if data['value'] < 0:
+            return 404
+        return {'value': data['value'], 'calls': CachedView.calls}
+
+
+class ETagView(ApiView):
+    etag = True
+    calls = 0
+
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            value=s.String(),
+            version=s.Optional(s.String()),
+            handler_etag=s.Optional(s.Boolean())
+        ),
+        Response(200, schema=s.Object(
+            value=s.String()
+        ))
+    )
+
+    def get_etag(self, data):
+        if 'version' in data:
+            return '"v{}"'.format(data['version'])
+
+    def handle(self, data):
+        ETagView.calls += 1
+        if data.get('handler_etag'):
+            return 200, {'value': data['value']}, '"handler-{}"'.format(data['value'])
+        return {'value': data['value']}
+
+
+class CompressedView(ApiView):
+    compression = Compression(min_size=100)
+
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            size=s.Integer()
+        ),
+        Response(200, schema=s.Object(
+            value=s.String()
+        )),
+        Response(201, schema=s.Object(
+            value=s.String()
+        ), compression=Compression(min_size=100, encodings=['deflate'])),
+        cache=ResponseCache(ttl=60)
+    )
+
+    def handle(self, data):
+        if data['size'] < 0:
+            return 201, {'value': 'x' * -data['size']}
+        return {'value': 'x' * data['size']}
+
+
+class ProfiledView(ApiView):
+    spec = Spec(
+        Method.GET,
+        s.Empty,
+        Response(204)
+    )
+
+    def handle(self, data):
+        time.sleep(0.02)
+        return 204
+
+
+class PagedView(ApiView):
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            overflow=s.Optional(s.Boolean())
+        ),
+        Response(200, schema=s.Page(s.Object(id=s.Integer()), max_limit=10, default_limit=4))
+    )
+
+    def handle(self, data):
+        start = data['cursor'] or 0
+        if data.get('overflow'):
+            return s.page([{'id': idx} for idx in range(11)])
+        ids = list(range(start, min(start + data['limit'], 25)))
+        return s.page([{'id': idx} for idx in ids], ids[-1] + 1 if ids[-1] < 24 else None)
+
+
+address = s.Definition('Address', s.Object(
+    city=s.String(),
+    street=s.Optional(s.String())
+))
+
+
+class FieldsView(ApiView):
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            broken=s.Optional(s.Boolean())
+        ),
+        Response(200, schema=s.Object(
+            id=s.Integer(),
+            name=s.String(),
+            bio=s.Optional(s.String()),
+            address=address,
+            friends=s.Array(s.Object(id=s.Integer(), name=s.String()))
+        )),
+        fields=True
+    )
+
+    def handle(self, data):
+        user = {
+            'id': 1,
+            'name': 'user',
+            'address': {'city': 'city', 'street': 'street'},
+            'friends': [{'id': 2, 'name': 'friend'}],
+        }
+        if data['fields'] is None or 'bio' in data['fields']:
+            user['bio'] = 'expensive'
+        if data.get('broken'):
+            del user['name']
+        return user
+
+
+class LimitedView(ApiView):
+    started = threading.Event()
+    release = threading.Event()
+
+    spec = Spec(
+        Method.GET,
+        s.Empty,
+        Response(204),
+        limit=ConcurrencyLimit(1, max_queue=1, queue_timeout=5)
+    )
+
+    def handle(self, data):
+        LimitedView.started.set()
+        LimitedView.release.wait(5)
+        return 204
+
+
+class TooManyView(ApiView):
+    concurrency_limit = ConcurrencyLimit(1, status=429, retry_after=7)
+
+    spec = Spec(
+        Method.GET,
+        s.Empty,
+        Response(204)
+    )
+
+    def handle(self, data):
+        return 204
+
+
+class CoalescedView(ApiView):
+    started = threading.Event()
+    release = threading.Event()
+    calls = 0
+
+    spec = Spec(
+        Method.GET,
+        s.Query(
+            q=s.String(),
+            fail=s.Optional(s.Boolean())
+        ),
+        Response(200, schema=s.Object(q=s.String(), calls=s.Integer())),
+        Response(404),
+        coalesce=True
+    )
+
+    def handle(self, data):
+        CoalescedView.calls += 1
+        CoalescedView.started.set()
+        CoalescedView.release.wait(5)
+        if data.get('fail'):
+            raise ValueError('handle failed')
+        if data['q'] == 'missing':
+            return 404
+        return 200, {'q': data['q'], 'calls': CoalescedView.calls}
+
+
+class LimitedStreamView(ApiView):
+    concurrency_limit = ConcurrencyLimit(1)
+
+    spec = Spec(
+        Method.GET,
+        s.Empty,
+        Response(200, schema=s.Array(s.Integer()))
+    )
+
+    def handle(self, data):
+        return iter(range(3))
@@ -115,3 +115,4 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 API_DEFAULT_ROUTER = 'test_project.api.router'
+API_WARM_UP = True
@@ -1,16 +1,51 @@
+import asyncio
+import gzip
+import hashlib
 import json
+import os
+import pickle
+import pstats
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
+from unittest import mock
 
 import yaml
+from asgiref.sync import async_to_sync
+from django.conf.urls import url
+from django.core.exceptions import TooManyFieldsSent
 from django.core.management import call_command
-from django.http import QueryDict
-from django.test import TestCase
+from django.db import connection
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncClient, RequestFactory, TestCase
+from django.urls import resolve, reverse
 
 import api.schema as s
+from api import artifact
+from api.compiler import compile_unit, validator
+from api.cache import DjangoBackend, ResponseCache, invalidate_tag, invalidate_view
+from api.coalesce import SingleFlight
+from api.codec import BACKENDS, Codec, get_codec
+from api.compression import Compression
 from api.exceptions import ConfigurationError
+from api.fields import parse_fields, project_schema
+from api.limits import ConcurrencyLimit
+from api.http import negotiate
+from api.msgpack import packb, unpackb
+from api.metrics import Histogram, ViewStats
+from api.profiling import profile
+from api.parsing import BodyTooLarge, read_body
+from api.router import DictDispatchPattern, Router
+from api.schema import DataError
 from api.spec import Spec, Response
 from api.swagger import validate
 from api.views import ApiView, Method
+from test_project.api import AsyncView, BackgroundValidationView, CachedView, CoalescedView, CompressedView, ETagView,\
+    EchoView, FailingOutContractView, FieldsView, InContractView, LimitedBodyView, LimitedStreamView, LimitedView,\
+    PagedView, ProfiledView, TooManyView, SampledValidationView, router
 
 
 class ApiConfig(TestCase):
@@ -46,6 +81,33 @@ class ApiConfig(TestCase):
         class Sub(Base):
             pass
 
+        self.assertIn(Base, router.views())
+        self.assertIn(Sub, router.views())
+        self.assertIs(router.operation('Sub'), Sub)
+
+    def test_warm_up(self):
+        warm = Router('warm')
+
+        class WarmView(ApiView):
+            router = warm
+            spec = Spec(
+                Method.GET,
+                s.Query(foo=s.Integer()),
+                Response(200, schema=s.Object(foo=s.Integer()))
+            )
+
+            def handle(self, data):
+                return data  # pragma: no cover
+
+        self.assertEqual(warm.views(), [WarmView])
+        self.assertNotIn(WarmView, router.views())
+        warm.warm_up()
+        self.assertIn('_compiled', WarmView.spec.payload.__dict__)
+        self.assertIn('_plan', WarmView.spec.payload.__dict__)
+        self.assertIn('_compiled', WarmView.spec.responses[0].schema.__dict__)
+        self.assertIn('json', warm.swagger_document().__dict__)
+        self.assertIs(warm.urls[0][0], warm.urls[0][0])
+
 
 class ApiBasics(TestCase):
     def test_method_not_allowed(self):
@@ -111,6 +173,79 @@ class ApiBasics(TestCase):
         self.assertDictEqual(json.loads(response.content.decode('utf-8')), data)
 
 
+class CodecTest(TestCase):
+    def test_backends(self):
+        data = {'foo': 'bär', 'list': [1, 2.5, None, True]}
+        for name, backend in BACKENDS.items():
+            try:
+                backend()
+            except ImportError:
+                continue
+            with self.settings(API_JSON_BACKEND=name):
+                self.assertIsInstance(get_codec(), backend)
+                response = self.client.post('/api/echo/', json.dumps(data), 'application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content.decode('utf-8')), data)
+
+                response = self.client.post('/api/echo/', b'{"foo": \xff}', 'application/json')
+                self.assertEqual(response.status_code, 400)
+
+                response = self.client.post('/api/schema/', json.dumps({}), 'application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(len(json.loads(response.content.decode('utf-8'))), 3)
+
+    def test_dumps_same_values(self):
+        data = {1: 'int key', 'big': 2 ** 70, 'nested': {2.5: [None]}}
+        expected = json.loads(BACKENDS['json']().dumps(data).decode('utf-8'))
+        for name, backend in BACKENDS.items():
+            try:
+                codec = backend()
+            except ImportError:
+                continue
+            self.assertEqual(json.loads(codec.dumps(data).decode('utf-8')), expected, name)
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Codec()
+
+    def test_unknown(self):
+        with self.settings(API_JSON_BACKEND='unknown'):
+            with self.assertRaises(ConfigurationError):
+                get_codec()
+
+
+class DictDispatchTest(TestCase):
+    def test_dispatch(self):
+        router.dict_dispatch = True
+        try:
+            class DictUrls:
+                urlpatterns = [url(r'^api/', router.urls)]
+        finally:
+            router.dict_dispatch = False
+        self.assertIsInstance(DictUrls.urlpatterns[0].url_patterns[0], DictDispatchPattern)
+
+        with self.settings(ROOT_URLCONF=DictUrls):
+            self.assertEqual(reverse('api:echo'), '/api/echo/')
+            self.assertEqual(resolve('/api/echo/').url_name, 'echo')
+
+            response = self.client.post('/api/echo/', json.dumps({'foo': 'bar'}), 'application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content.decode('utf-8')), {'foo': 'bar'})
+
+            response = self.client.get('/api/get_method/')
+            self.assertEqual(response.status_code, 204)
+
+            response = self.client.get('/api/swagger.json')
+            self.assertEqual(response.status_code, 200)
+
+            for path in ('/api/unknown/', '/api/unknown', '/api/echo/echo/'):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 404)
+
+            response = self.client.get('/api/echo')
+            self.assertEqual(response.status_code, 301)
+
+
 class SchemaViewTest(TestCase):
     def test_in_schema(self):
         response = self.client.post('/api/schema/', json.dumps({
@@ -134,6 +269,14 @@ class SchemaViewTest(TestCase):
         }), content_type='application/json')
         self.assertEqual(response.status_code, 200)
 
+    def test_max_errors(self):
+        response = self.client.post('/api/bounded_errors/', json.dumps([{'foo': idx} for idx in range(1000)]),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content.decode('utf-8')),
+                         [{'path': [0, 'foo'], 'error': "0 is not of type 'string'"},
+                          {'path': [1, 'foo'], 'error': "1 is not of type 'string'"}])
+
     def test_unknown_response(self):
         response = self.client.get('/api/unknown_response/', {'status': '200'})
         self.assertEqual(response.status_code, 500)
@@ -142,6 +285,300 @@ class SchemaViewTest(TestCase):
         self.assertEqual(response.status_code, 500)
 
 
+class ResponseValidationTest(TestCase):
+    def test_sampled(self):
+        response = self.client.get('/api/sampled_validation/')
+        self.assertEqual(response.status_code, 200)
+
+        with self.settings(API_RESPONSE_VALIDATION='api.validation.Always'):
+            with mock.patch.object(SampledValidationView, 'response_validation', None):
+                response = self.client.get('/api/sampled_validation/')
+        self.assertEqual(response.status_code, 500)
+
+    def test_first_items(self):
+        response = self.client.get('/api/first_items_validation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), [1, 'two'])
+
+    def test_background(self):
+        policy = BackgroundValidationView.response_validation
+        response = self.client.get('/api/background_validation/')
+        self.assertEqual(response.status_code, 200)
+        policy.join()
+        self.assertEqual(policy.checked, 1)
+        self.assertEqual(policy.violations, 1)
+
+
+class StreamingTest(TestCase):
+    def test_stream(self):
+        response = self.client.get('/api/stream/', {'count': '20000', 'fail': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(b''.join(chunks).decode('utf-8')), [{'id': idx} for idx in range(20000)])
+
+        response = self.client.get('/api/stream/', {'count': '0', 'fail': ''})
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode('utf-8')), [])
+
+    def test_stream_failure(self):
+        response = self.client.get('/api/stream/', {'count': '2', 'fail': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'[{"id": 0},{"id": 1}')
+
+
+class BodySizeTest(TestCase):
+    def test_limit(self):
+        response = self.client.post('/api/limited_body/', json.dumps({'foo': 'bar'}), 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {'foo': 'bar'})
+
+        response = self.client.post('/api/limited_body/', json.dumps({'foo': 'x' * 64}), 'application/json')
+        self.assertEqual(response.status_code, 413)
+
+        response = self.client.post('/api/limited_body/', '{"foo": "bar"}}', 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_chunked_read(self):
+        body = json.dumps({'foo': 'x' * 100}).encode('utf-8')
+        request = RequestFactory().post('/', body, 'application/json')
+        self.assertEqual(read_body(request, len(body), chunk_size=7), body)
+
+        request = RequestFactory().post('/', body, 'application/json')
+        with self.assertRaises(BodyTooLarge):
+            read_body(request, len(body) - 1, chunk_size=7)
+
+
+class AsyncViewTest(TestCase):
+    def test_async(self):
+        self.assertTrue(AsyncView.is_async)
+        self.assertTrue(asyncio.iscoroutinefunction(AsyncView.as_view()))
+
+        response = self.client.get('/api/async/', {'result': 'int'})
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get('/api/async/', {'result': 'dict'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), {'result': 'dict'})
+
+        response = self.client.get('/api/async/', {'result': 'fail'})
+        self.assertEqual(response.status_code, 500)
+
+        response = self.client.post('/api/async/')
+        self.assertEqual(response.status_code, 405)
+
+    def test_async_client(self):
+        async def fetch():
+            return await asyncio.gather(*[AsyncClient().get('/api/async/?result={}'.format(idx)) for idx in range(5)])
+
+        for idx, response in enumerate(async_to_sync(fetch)()):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content.decode('utf-8')), {'result': str(idx)})
+
+
+class BatchTest(TestCase):
+    def test_batch(self):
+        response = self.client.post('/api/batch/', json.dumps([
+            {'operation': 'Echo', 'payload': {'foo': 'bar'}},
+            {'operation': 'InContract', 'payload': {'foo': 1}},
+            {'operation': 'InContract', 'payload': {'foo': 'bar'}},
+            {'operation': 'ReturnStatus', 'payload': {'result': 'fail'}},
+            {'operation': 'Async', 'payload': {'result': 'dict'}},
+            {'operation': 'Stream', 'payload': {'count': 2, 'fail': False}},
+            {'operation': 'Stream', 'payload': {'count': 2, 'fail': True}},
+            {'operation': 'GetMethod'},
+            {'operation': 'Unknown'},
+        ]), 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), [
+            {'status': 200, 'body': {'foo': 'bar'}},
+            {'status': 204, 'body': None},
+            {'status': 400, 'body': [{'path': ['foo'], 'error': "'bar' is not of type 'number'"}]},
+            {'status': 500, 'body': None},
+            {'status': 200, 'body': {'result': 'dict'}},
+            {'status': 200, 'body': [{'id': 0}, {'id': 1}]},
+            {'status': 500, 'body': None},
+            {'status': 204, 'body': None},
+            {'status': 404, 'body': None},
+        ])
+
+    def test_invalid(self):
+        response = self.client.post('/api/batch/', 'spam', 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/batch/', json.dumps([{'payload': {}}]), 'application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/batch/', json.dumps([{'operation': 'GetMethod'}] * 51), 'application/json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_connections(self):
+        entries = json.dumps([{'operation': 'Echo', 'payload': {'foo': 'bar'}}] * 3)
+        with mock.patch('api.batch.close_old_connections') as close:
+            response = self.client.post('/api/batch/', entries, 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(close.call_count, 6)
+
+        with mock.patch.dict(connection.settings_dict, {'ATOMIC_REQUESTS': True}), \
+                mock.patch('api.batch.close_old_connections') as close:
+            response = self.client.post('/api/batch/', entries, 'application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(close.call_count, 0)
+
+    def test_client_headers(self):
+        response = self.client.post('/api/batch/', json.dumps([
+            {'operation': 'Compressed', 'payload': {'size': 500}},
+            {'operation': 'ETag', 'payload': {'value': 'spam'}},
+        ]), 'application/json', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='*', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content.decode('utf-8')), [
+            {'status': 200, 'body': {'value': 'x' * 500}},
+            {'status': 200, 'body': {'value': 'spam'}},
+        ])
+
+
+class ResponseCacheTest(TestCase):
+    def get(self, value, **params):
+        response = self.client.get('/api/cached/', dict(params, value=value))
+        if response.status_code != 200:
+            return response.status_code
+        return json.loads(response.content.decode('utf-8'))['calls']
+
+    def test_cache(self):
+        invalidate_view(CachedView)
+        first = self.get(1)
+        self.assertEqual(self.get(1), first)
+        self.assertEqual(self.get('1'), first)
+        self.assertEqual(self.get(1, flags=['a', 'b']), first + 1)
+        self.assertEqual(self.get(1, flags=['a', 'b']), first + 1)
+
+        # failures are not cached
+        self.assertEqual(self.get(-1), 404)
+        calls = CachedView.calls
+        self.assertEqual(self.get(-1), 404)
+        self.assertEqual(CachedView.calls, calls + 1)
+
+        # lru eviction over max_entries
+        self.get(2)
+        self.get(3)
+        self.assertEqual(self.get(1), CachedView.calls)
+
+    def test_invalidation(self):
+        first = self.get(5)
+        self.assertEqual(self.get(5), first)
+        invalidate_view(CachedView)
+        second = self.get(5)
+        self.assertGreater(second, first)
+        self.assertEqual(self.get(5), second)
+        invalidate_tag('cached')
+        self.assertGreater(self.get(5), second)
+
+    def test_django_backend(self):
+        cache = ResponseCache(backend=DjangoBackend())
+        response = HttpResponse(b'{}', content_type='application/json')
+        key = cache.key('View', {'a': 1})
+        self.assertIsNone(cache.get(key))
+        cache.set(key, response)
+        self.assertEqual(cache.get(key).response().content, b'{}')
+
+        cache.backend.bump('view:View')
+        self.assertIsNone(cache.get(cache.key('View', {'a': 1})))
+
+    def test_django_backend_round_trips(self):
+        cache = ResponseCache(backend=DjangoBackend(), tags=['a', 'b'])
+        with mock.patch.object(cache.backend.cache, 'get_many', wraps=cache.backend.cache.get_many) as get_many:
+            cache.key('View', {'a': 1})
+        get_many.assert_called_once_with(['api:gen:view:View', 'api:gen:tag:a', 'api:gen:tag:b'])
+
+    def test_django_backend_compressed(self):
+        cache = ResponseCache(backend=DjangoBackend())
+        key = cache.key('View', {'a': 1})
+        cached = cache.set(key, HttpResponse(b'{}', content_type='application/json'))
+        cached.compressed['gzip'] = b'gzipped'
+        self.assertEqual(cache.get(key).compressed, {})
+        cache.update(key, cached)
+        self.assertEqual(cache.get(key).compressed, {'gzip': b'gzipped'})
+
+    def test_same_name(self):
+        cache = ResponseCache(backend=DjangoBackend())
+        calls = []
+        views = []
+        for version in ('v1', 'v2'):
+            views.append(type('UsersView', (ApiView,), {
+                '__module__': 'users.{}'.format(version),
+                'router': Router(version),
+                'response_cache': cache,
+                'spec': Spec(Method.GET, s.Empty, Response(200, schema=s.Object(version=s.String()))),
+                'handle': lambda self, data, version=version: calls.append(version) or {'version': version},
+            }))
+        for view, version in zip(views * 2, ('v1', 'v2') * 2):
+            response = view.as_view()(RequestFactory().get('/'))
+            self.assertEqual(json.loads(response.content.decode('utf-8')), {'version': version})
+
+        self.assertEqual(calls, ['v1', 'v2'])
+
+        invalidate_view(views[0])
+        for view in views:
+            view.as_view()(RequestFactory().get('/'))
+        self.assertEqual(calls, ['v1', 'v2', 'v1'])
+
+    def test_config(self):
+        with self.assertRaises(ConfigurationError):
+            Spec(Method.POST, s.Empty, Response(204), cache=ResponseCache())
+        with self.assertRaises(ConfigurationError):
+            class CachedPostView(ApiView):
+                response_cache = ResponseCache()
+                spec = Spec(Method.POST, s.Empty, Response(204))
+
+                def handle(self, data):
+                    return 204
+
+
+class ETagTest(TestCase):
+    def test_auto(self):
+        response = self.client.get('/api/e_tag/', {'value': 'foo'})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(etag, '"{}"'.format(hashlib.sha1(response.content).hexdigest()))
+
+        not_modified = ETagView.stats['not_modified']
+        response = self.client.get('/api/e_tag/', {'value': 'foo'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(ETagView.stats['not_modified'], not_modified + 1)
+
+        response = self.client.get('/api/e_tag/', {'value': 'bar'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_before_handle(self):
+        calls = ETagView.calls
+        response = self.client.get('/api/e_tag/', {'value': 'foo', 'version': '1'}, HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(ETagView.calls, calls)
+
+        response = self.client.get('/api/e_tag/', {'value': 'foo', 'version': '2'}, HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"v2"')
+        self.assertEqual(ETagView.calls, calls + 1)
+
+    def test_from_handler(self):
+        response = self.client.get('/api/e_tag/', {'value': 'foo', 'handler_etag': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"handler-foo"')
+
+        response = self.client.get('/api/e_tag/', {'value': 'foo', 'handler_etag': 'true'},
+                                   HTTP_IF_NONE_MATCH='W/"handler-foo"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached(self):
+        response = self.client.get('/api/cached/', {'value': '10'})
+        etag = response['ETag']
+        calls = CachedView.calls
+        response = self.client.get('/api/cached/', {'value': '10'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(CachedView.calls, calls)
+
+
 class SchemaTestCase(TestCase):
     def test_schema(self):
         child = s.Definition('TestChild', s.Object(
@@ -181,6 +618,61 @@ class SchemaTestCase(TestCase):
             {'path': ['str'], 'error': "1 is not of type 'string'"}
         ])
 
+    def test_max_errors(self):
+        class Uncompiled(s.Array):
+            _compiled = None
+
+        data = ['a', 'b', 'c']
+        for schema in (s.Array(s.Integer()), Uncompiled(s.Integer())):
+            with self.assertRaises(s.DataError) as ctx:
+                schema.check_and_return(data, max_errors=1)
+            self.assertEqual(ctx.exception.as_dict(), [{'path': [0], 'error': "'a' is not of type 'integer'"}])
+
+            with self.assertRaises(s.DataError) as ctx:
+                schema.check_and_return(data, max_errors=2)
+            self.assertEqual(len(ctx.exception.errors), 2)
+
+            with self.assertRaises(s.DataError) as ctx:
+                schema.check_and_return(data)
+            self.assertEqual(len(ctx.exception.errors), 3)
+
+            with self.assertRaises(s.DataError) as ctx:
+                schema.check_and_return(data, max_errors=0)
+            self.assertEqual(len(ctx.exception.errors), 1)
+
+        for overrides in ({'API_MAX_ERRORS': 0}, {}):
+            with self.settings(**overrides), self.assertRaises(ConfigurationError):
+                class Misconfigured(ApiView):
+                    max_errors = None if overrides else -1
+                    spec = Spec(Method.POST, s.Object(), Response(204))
+
+                    def handle(self, data):
+                        return 204
+
+    def test_nested_definitions(self):
+        inner = s.Definition('NestedInner', s.Object(
+            value=s.Integer()
+        ))
+        outer = s.Definition('NestedOuter', s.Object(
+            inner=inner
+        ))
+        schema = s.Array(outer)
+        self.assertEqual(s.embed_definitions(schema.to_json())['definitions'], {
+            'NestedOuter': outer.schema.to_json(),
+            'NestedInner': inner.schema.to_json(),
+        })
+
+        class Uncompiled(s.Array):
+            _compiled = None
+
+        for schema in (s.Array(outer), Uncompiled(outer)):
+            self.assertEqual(schema.check_and_return([{'inner': {'value': 1}}]), [{'inner': {'value': 1}}])
+            with self.assertRaises(s.DataError) as ctx:
+                schema.check_and_return([{'inner': {'value': 1}}, {'inner': {'value': ''}}])
+            self.assertEqual(ctx.exception.as_dict(), [
+                {'path': [1, 'inner', 'value'], 'error': "'' is not of type 'integer'"}
+            ])
+
     def test_duplicate(self):
         s.Definition('Duplicate', s.String())
         with self.assertRaises(ConfigurationError):
@@ -211,9 +703,726 @@ class SchemaTestCase(TestCase):
             'error': "'None' is not of type 'integer'"
         }])
 
+    def test_qs_raw(self):
+        schema = s.Query(
+            string=s.String(),
+            number=s.Optional(s.Number()),
+            integer=s.Integer(),
+            boolean=s.Boolean(),
+            array=s.Array(s.Integer()),
+            optional_array=s.Optional(s.Array(s.String()))
+        )
+        queries = [
+            'string=foo+bar&number=1.2&integer=1&boolean=true&array=1&array=2&optional_array=%C3%A9',
+            'string=foo&string=bar&integer=1&boolean=',
+            'integer=x',
+            'integer=1&array=1&array=x',
+            'integer=1&boolean=yes',
+            '',
+        ]
+        for query in queries:
+            try:
+                expected = schema.qs_check_and_return(QueryDict(query))
+            except s.DataError as err:
+                with self.assertRaises(s.DataError) as ctx:
+                    schema.qs_check_and_return(query)
+                self.assertEqual(ctx.exception.as_dict(), err.as_dict())
+            else:
+                self.assertEqual(schema.qs_check_and_return(query), expected)
+
+        with self.assertRaises(TooManyFieldsSent):
+            schema.qs_check_and_return('string=foo&' * 10, max_num_fields=10)
+
+    def test_qs_request(self):
+        for query in ('value=привет', 'value=%D0%BF%D1%80%D0%B8%D0%B2%D0%B5%D1%82', 'value=%FF%FE'):
+            request = RequestFactory().get('/?' + query)
+            response = self.client.get('/api/e_tag/?' + query)
+            self.assertEqual(response.json(), {'value': request.GET['value']})
+
+        with self.assertRaises(TooManyFieldsSent):
+            ETagView.as_view()(RequestFactory().get('/?value=foo' + '&spam=' * 2000))
+
 
 class SwaggerTestCase(TestCase):
     def test_spec(self):
         output = StringIO()
         call_command('swagger_spec', stdout=output)
         validate(yaml.load(output.getvalue()))
+
+    def test_endpoint(self):
+        response = self.client.get('/api/swagger.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        spec = json.loads(response.content.decode('utf-8'))
+        validate(spec)
+        etag = response['ETag']
+
+        response = self.client.get('/api/swagger.json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/api/swagger.json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/' + etag)
+        self.assertEqual(json.loads(gzip.decompress(response.content).decode('utf-8')), spec)
+
+        response = self.client.get('/api/swagger.json', HTTP_IF_NONE_MATCH='W/' + etag, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], 'W/' + etag)
+
+        patterns = Router('private').urls[0]
+        self.assertFalse(any(getattr(pattern, 'name', None) == 'swagger_json' for pattern in patterns))
+
+        response = self.client.get('/api/swagger.yaml')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(yaml.safe_load(response.content.decode('utf-8')), spec)
+
+
+class CompilerTestCase(TestCase):
+    def assertSameErrors(self, schema, instance):
+        self.assertIsNotNone(schema._compiled)
+        expected = sorted(schema._validator.iter_errors(instance), key=str)
+        actual = []
+        schema._compiled(instance, actual)
+        actual.sort(key=str)
+        self.assertEqual([str(err) for err in actual], [str(err) for err in expected])
+        self.assertEqual(DataError(actual).as_dict(), DataError(expected).as_dict())
+
+    def test_differential(self):
+        leaf = s.Definition('CompilerLeaf', s.Object(
+            name=s.String(),
+            tags=s.Optional(s.Array(s.String()))
+        ))
+        schema = s.Object(
+            str=s.String(),
+            number=s.Optional(s.Number()),
+            integer=s.Integer(),
+            null=s.Null(),
+            boolean=s.Boolean(),
+            matrix=s.Array(s.Array(s.Integer())),
+            leaf=leaf,
+            leaves=s.Optional(s.Array(leaf)),
+            empty=s.Optional(s.Object())
+        )
+        instances = [
+            {'str': '', 'integer': 1, 'null': None, 'boolean': False, 'matrix': [[1]], 'leaf': {'name': ''}},
+            {'str': 1, 'number': True, 'integer': 1.0, 'null': 0, 'boolean': 1, 'matrix': [[1, '2'], 3],
+             'leaf': {'tags': [1, '']}, 'leaves': [{'name': 1}, [], None], 'empty': []},
+            {'number': 1.5, 'matrix': [], 'leaf': []},
+            {'str': None, 'integer': False, 'matrix': {}, 'leaf': None, 'leaves': {}},
+            [],
+            None,
+            'string',
+        ]
+        for instance in instances:
+            self.assertSameErrors(schema, instance)
+
+        for scalar in (s.String(), s.Number(), s.Integer(), s.Boolean(), s.Null(), s.Array(s.Number()), leaf):
+            for instance in ('', 0, 1.5, True, None, [1, 'a'], {}, {'name': ''}):
+                self.assertSameErrors(scalar, instance)
+
+    def test_page(self):
+        schema = s.Page(s.Object(id=s.Integer()), max_limit=2, default_limit=2)
+        for instance in ({'items': []}, {'items': [{'id': 1}, {'id': 'a'}, {}], 'next': 1}, {'items': {}}, []):
+            self.assertSameErrors(schema, instance)
+
+    def test_fallback(self):
+        class Custom(s.Schema):
+            def to_json(self):
+                return {'type': 'string'}
+
+        schema = s.Array(Custom())
+        self.assertIsNone(schema._compiled)
+        self.assertEqual(schema.check_and_return(['']), [''])
+        with self.assertRaises(s.DataError) as ctx:
+            schema.check_and_return([1])
+        self.assertEqual(ctx.exception.as_dict(), [{'path': [0], 'error': "1 is not of type 'string'"}])
+
+
+class CompressionTest(TestCase):
+    def test_gzip(self):
+        response = self.client.get('/api/compressed/', {'size': '1000'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), {'value': 'x' * 1000})
+
+    def test_threshold(self):
+        response = self.client.get('/api/compressed/', {'size': '10'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response.json(), {'value': 'x' * 10})
+
+    def test_not_accepted(self):
+        response = self.client.get('/api/compressed/', {'size': '1001'})
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get('/api/compressed/', {'size': '1001'}, HTTP_ACCEPT_ENCODING='gzip;q=0, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_per_response(self):
+        response = self.client.get('/api/compressed/', {'size': '-1000'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Content-Encoding'], 'deflate')
+        self.assertEqual(json.loads(zlib.decompress(response.content)), {'value': 'x' * 1000})
+
+    def test_cached(self):
+        bytes_in = CompressedView.stats['compression_input_bytes']
+        first = self.client.get('/api/compressed/', {'size': '2000'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertGreater(CompressedView.stats['compression_input_bytes'], bytes_in)
+        self.assertLess(CompressedView.stats['compression_output_bytes'],
+                        CompressedView.stats['compression_input_bytes'])
+
+        bytes_in = CompressedView.stats['compression_input_bytes']
+        second = self.client.get('/api/compressed/', {'size': '2000'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(CompressedView.stats['compression_input_bytes'], bytes_in)
+
+    def test_unsupported(self):
+        with self.assertRaises(ConfigurationError):
+            Compression(encodings=['br'])
+
+
+class MetricsTest(TestCase):
+    def test_histogram(self):
+        histogram = Histogram((1, 10))
+        for value in (0.5, 1, 5, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 106.5)
+
+    def test_threads(self):
+        stats = ViewStats('threads')
+        threads = [threading.Thread(target=lambda: [stats.observe('value', 1) for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stats.histograms()['value'].count, 400)
+        # shards of finished threads are folded
+        self.assertEqual(stats._shards, [])
+
+        stats.observe('value', 1)
+        self.assertEqual(len(stats._shards), 1)
+        self.assertEqual(stats.histograms()['value'].count, 401)
+
+    def test_phases(self):
+        count = EchoView.stats.histograms().get('phase_seconds{phase="handle"}', Histogram(())).count
+        self.client.post('/api/echo/', json.dumps({'foo': 'bar'}), 'application/json')
+        histograms = EchoView.stats.histograms()
+        self.assertEqual(histograms['phase_seconds{phase="handle"}'].count, count + 1)
+        for phase in ('parse', 'request_validation', 'response_validation', 'serialize'):
+            self.assertIn('phase_seconds{{phase="{}"}}'.format(phase), histograms)
+        self.assertIn('request_bytes', histograms)
+        self.assertIn('response_bytes', histograms)
+
+    def test_contract_failures(self):
+        failures = InContractView.stats['contract_failures{status="400"}']
+        self.client.get('/api/in_contract/', {'foo': 'bar'})
+        self.assertEqual(InContractView.stats['contract_failures{status="400"}'], failures + 1)
+
+        failures = FailingOutContractView.stats['contract_failures{status="500"}']
+        self.client.get('/api/failing_out_contract/', {'result': ''})
+        self.assertEqual(FailingOutContractView.stats['contract_failures{status="500"}'], failures + 1)
+
+        failures = LimitedBodyView.stats['contract_failures{status="413"}']
+        self.client.post('/api/limited_body/', json.dumps({'foo': 'x' * 64}), 'application/json')
+        self.assertEqual(LimitedBodyView.stats['contract_failures{status="413"}'], failures + 1)
+
+    def test_endpoint(self):
+        self.client.get('/api/in_contract/', {'foo': 'bar'})
+        self.client.get('/api/in_contract/', {'foo': '1'})
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE api_phase_seconds histogram', lines)
+        self.assertIn('# TYPE api_contract_failures_total counter', lines)
+        self.assertEqual(lines.count('# TYPE api_phase_seconds histogram'), 1)
+        self.assertTrue(any(line.startswith('api_contract_failures_total{view="InContractView",status="400"} ')
+                            for line in lines))
+        self.assertTrue(any(line.startswith('api_phase_seconds_bucket{view="InContractView",phase="handle",le="+Inf"} ')
+                            for line in lines))
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_sample(self):
+        self.assertNotIn('_handle', ProfiledView.__dict__)
+        profiler = profile(ProfiledView, requests=2, directory=self.directory.name)
+        self.assertIn('_handle', ProfiledView.__dict__)
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/profiled/').status_code, 204)
+
+        self.assertFalse(profiler.active)
+        self.assertNotIn('_handle', ProfiledView.__dict__)
+        self.assertEqual(profiler.profiled, 2)
+        self.assertEqual(os.listdir(self.directory.name), [os.path.basename(profiler.path)])
+        with open(profiler.path) as fp:
+            lines = fp.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('_handle '))
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any(';handle ' in line for line in lines))
+
+    def test_cprofile(self):
+        profiler = profile(ProfiledView, requests=1, directory=self.directory.name, mode='cprofile')
+        self.client.get('/api/profiled/')
+        self.assertTrue(profiler.path.endswith('.prof'))
+        stats = pstats.Stats(profiler.path)
+        self.assertTrue(any(name == 'handle' for _, _, name in stats.stats))
+
+    def test_rate(self):
+        profiler = profile(ProfiledView, requests=1, rate=0, directory=self.directory.name)
+        self.client.get('/api/profiled/')
+        self.assertTrue(profiler.active)
+        self.assertIsNone(profiler.stop())
+        self.assertNotIn('_handle', ProfiledView.__dict__)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_async(self):
+        profiler = profile(AsyncView, requests=1, directory=self.directory.name)
+
+        async def fetch():
+            return await AsyncClient().get('/api/async/?result=str')
+
+        response = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(profiler.profiled, 1)
+        self.assertFalse(profiler.active)
+
+
+class ArtifactTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'api.artifact')
+
+    def test_unit_pickle(self):
+        schema = s.Object(foo=s.Array(s.Integer()))
+        validate = validator(pickle.loads(pickle.dumps(compile_unit(schema))))
+        errors = []
+        validate({'foo': [1, 'a']}, errors)
+        self.assertEqual(DataError(errors).as_dict(), [{'path': ['foo', 1], 'error': "'a' is not of type 'integer'"}])
+
+    def test_command(self):
+        output = StringIO()
+        call_command('api_compile', output=self.path, stdout=output)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertIn('validators', output.getvalue())
+
+    def test_load(self):
+        artifact.dump(router, self.path)
+        payload = EchoView.spec.payload
+        payload.__dict__.pop('_compiled', None)
+        document = router.swagger_document()
+
+        self.assertTrue(artifact.load(router, self.path))
+        self.assertIn('_compiled', payload.__dict__)
+        with self.assertRaises(DataError):
+            payload.check_and_return([])
+        self.assertIsNot(router.swagger_document(), document)
+        self.assertEqual(router.swagger_document().json.content, document.json.content)
+
+    def test_stale(self):
+        artifact.dump(router, self.path)
+        with mock.patch('api.artifact.source_hash', return_value='other'):
+            self.assertFalse(artifact.load(router, self.path))
+        self.assertFalse(artifact.load(router, self.path + '.missing'))
+
+    def test_stale_schemas(self):
+        artifact.dump(router, self.path)
+        with mock.patch.dict(s.DEFINITIONS[s.DEFINITIONS_PATH], {'Address': {'type': 'string'}}):
+            self.assertFalse(artifact.load(router, self.path))
+        with mock.patch.object(EchoView.spec, 'payload', s.Object(bar=s.String())):
+            self.assertFalse(artifact.load(router, self.path))
+        self.assertTrue(artifact.load(router, self.path))
+
+
+class PaginationTest(TestCase):
+    def test_pages(self):
+        ids = []
+        query = {'limit': '7'}
+        while True:
+            response = self.client.get('/api/paged/', query)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['items']), 7)
+            ids += [item['id'] for item in data['items']]
+            if 'next' not in data:
+                break
+            query = {'limit': '7', 'cursor': data['next']}
+        self.assertEqual(ids, list(range(25)))
+
+    def test_limit(self):
+        self.assertEqual(len(self.client.get('/api/paged/').json()['items']), 4)
+        self.assertEqual(len(self.client.get('/api/paged/', {'limit': '1000'}).json()['items']), 10)
+        self.assertEqual(len(self.client.get('/api/paged/', {'limit': '0'}).json()['items']), 1)
+
+    def test_stable_cursor(self):
+        first = self.client.get('/api/paged/').json()['next']
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            self.assertEqual(self.client.get('/api/paged/').json()['next'], first)
+
+    def test_foreign_cursor(self):
+        cursor = s.Page.sign({'next': 4}, s.cursor_salt('OtherPagedView'))['next']
+        response = self.client.get('/api/paged/', {'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        cursor = s.Page.sign({'next': 4}, s.cursor_salt('PagedView'))['next']
+        self.assertEqual(self.client.get('/api/paged/', {'cursor': cursor}).json()['items'][0], {'id': 4})
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/paged/', {'cursor': 'forged'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), [{'path': ['cursor'], 'error': 'invalid cursor'}])
+
+    def test_overflow(self):
+        response = self.client.get('/api/paged/', {'overflow': 'true'})
+        self.assertEqual(response.status_code, 500)
+
+    def test_swagger(self):
+        parameters = {parameter['name']: parameter for parameter in PagedView.swagger_spec.spec['get']['parameters']}
+        self.assertEqual(set(parameters), {'overflow', 'cursor', 'limit'})
+        self.assertEqual(parameters['limit']['maximum'], 10)
+        self.assertEqual(parameters['limit']['default'], 4)
+        self.assertFalse(parameters['cursor']['required'])
+        validate(router.swagger())
+
+    def test_config(self):
+        with self.assertRaises(ConfigurationError):
+            Spec(Method.POST, s.Object(), Response(200, schema=s.Page(s.String())))
+        with self.assertRaises(ConfigurationError):
+            Spec(Method.GET, s.Query(limit=s.Integer()), Response(200, schema=s.Page(s.String())))
+        with self.assertRaises(ConfigurationError):
+            s.Page(s.String(), max_limit=5, default_limit=10)
+
+
+class FieldsTest(TestCase):
+    def test_all(self):
+        response = self.client.get('/api/fields/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['bio'], 'expensive')
+
+    def test_projection(self):
+        response = self.client.get('/api/fields/', {'fields': 'id, address.city,friends.name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'id': 1, 'address': {'city': 'city'}, 'friends': [{'name': 'friend'}]})
+
+        response = self.client.get('/api/fields/', {'fields': 'bio,address.city,address'})
+        self.assertEqual(response.json(), {'bio': 'expensive', 'address': {'city': 'city', 'street': 'street'}})
+
+    def test_invalid(self):
+        for value, error in (('unknown', "unknown field 'unknown'"), ('address.zip', "unknown field 'address.zip'"),
+                             ('id.value', "'id' has no fields"), ('', 'no fields requested'),
+                             ('id..x', "invalid field 'id..x'")):
+            response = self.client.get('/api/fields/', {'fields': value})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), [{'path': ['fields'], 'error': error}])
+
+    def test_validation(self):
+        response = self.client.get('/api/fields/', {'fields': 'id', 'broken': 'true'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/fields/', {'fields': 'name', 'broken': 'true'})
+        self.assertEqual(response.status_code, 500)
+
+    def test_cached_schema(self):
+        schema = FieldsView.spec.fields_response.schema
+        tree = parse_fields('friends.id,id', schema)
+        self.assertEqual(tree, {'friends': {'id': {}}, 'id': {}})
+        self.assertIs(project_schema(schema, tree), project_schema(schema, parse_fields('id,friends.id', schema)))
+
+    def test_swagger(self):
+        parameters = {parameter['name']: parameter for parameter in FieldsView.swagger_spec.spec['get']['parameters']}
+        self.assertIn('description', parameters['fields'])
+        with self.assertRaises(ConfigurationError):
+            Spec(Method.GET, s.Empty, Response(204), fields=True)
+
+
+class MsgpackTest(TestCase):
+    MSGPACK = 'application/msgpack'
+
+    def test_roundtrip(self):
+        values = [None, True, False, 0, 127, 128, 65536, 2 ** 64 - 1, -1, -33, -129, -2 ** 63, 1.5, '', 'a' * 32,
+                  'é' * 200, b'\x00' * 300, [1.0, -2.5], [1, 'a', None], list(range(20)),
+                  {'a': {'b': [1, {'c': 2.5}]}}, {str(idx): idx for idx in range(20)}, [0.25] * 70000]
+        for value in values:
+            self.assertEqual(unpackb(packb(value)), value)
+        self.assertEqual(packb(1.0), b'\xcb\x3f\xf0\x00\x00\x00\x00\x00\x00')
+        self.assertEqual(packb([1.0, 2.0]), b'\x92' + packb(1.0) + packb(2.0))
+        self.assertEqual(packb({'a': 1}), b'\x81\xa1a\x01')
+
+    def test_malformed(self):
+        for data in (b'', b'\xc1', b'\x92\x01', b'\x01\x02', b'\xd9\x05ab', b'\x81\x90\x01'):
+            with self.assertRaises(ValueError):
+                unpackb(data)
+        with self.assertRaises(ValueError):
+            packb(2 ** 64)
+
+    def test_negotiate(self):
+        factory = RequestFactory()
+        types = ['application/json', self.MSGPACK]
+        for accept, expected in ((None, 'application/json'), ('application/msgpack', self.MSGPACK),
+                                 ('application/*;q=0.5, application/msgpack', self.MSGPACK),
+                                 ('application/msgpack;q=0.5, application/json', 'application/json'),
+                                 ('text/html', 'application/json'), ('*/*', 'application/json')):
+            headers = {'HTTP_ACCEPT': accept} if accept else {}
+            self.assertEqual(negotiate(factory.get('/', **headers), types), expected)
+
+    def test_post(self):
+        data = {'foo': [1.5, 2.5], 'bar': {'baz': None}}
+        response = self.client.post('/api/echo/', packb(data), self.MSGPACK, HTTP_ACCEPT=self.MSGPACK)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], self.MSGPACK)
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(unpackb(response.content), data)
+
+        response = self.client.post('/api/echo/', packb(data), self.MSGPACK)
+        self.assertEqual(response.json(), data)
+
+        response = self.client.post('/api/echo/', packb(data), self.MSGPACK, HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response['Content-Type'], self.MSGPACK)
+        self.assertEqual(unpackb(response.content), data)
+
+        response = self.client.post('/api/echo/', b'\xc1', self.MSGPACK)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/echo/', packb([1]), self.MSGPACK)
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream(self):
+        response = self.client.get('/api/stream/', {'count': '3', 'fail': ''}, HTTP_ACCEPT=self.MSGPACK)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(unpackb(response.content), [{'id': 0}, {'id': 1}, {'id': 2}])
+
+    def test_cache(self):
+        json_response = self.client.get('/api/cached/', {'value': '30'})
+        msgpack_response = self.client.get('/api/cached/', {'value': '30'}, HTTP_ACCEPT=self.MSGPACK)
+        self.assertEqual(msgpack_response['Content-Type'], self.MSGPACK)
+        self.assertEqual(unpackb(msgpack_response.content)['value'], json_response.json()['value'])
+        self.assertEqual(self.client.get('/api/cached/', {'value': '30'})['Content-Type'], 'application/json')
+
+    def test_disabled(self):
+        with self.settings(API_MSGPACK=False):
+            response = self.client.get('/api/stream/', {'count': '3', 'fail': ''}, HTTP_ACCEPT=self.MSGPACK)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(router.swagger()['produces'], ['application/json'])
+        self.assertEqual(router.swagger()['consumes'], ['application/json', self.MSGPACK])
+
+
+class ConcurrencyLimitTest(TestCase):
+    def setUp(self):
+        LimitedView.started.clear()
+        LimitedView.release.clear()
+        self.addCleanup(LimitedView.release.set)
+
+    def request(self, responses):
+        responses.append(self.client.get('/api/limited/'))
+
+    def test_shed(self):
+        responses = []
+        holder = threading.Thread(target=self.request, args=(responses,))
+        holder.start()
+        self.assertTrue(LimitedView.started.wait(5))
+        self.assertEqual(LimitedView.stats.gauges(), {'in_flight': 1, 'queued': 0})
+
+        waiter = threading.Thread(target=self.request, args=(responses,))
+        waiter.start()
+        while LimitedView.stats.gauges()['queued'] != 1:
+            time.sleep(0.001)
+
+        shed = LimitedView.stats['shed']
+        response = self.client.get('/api/limited/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(LimitedView.stats['shed'], shed + 1)
+
+        LimitedView.release.set()
+        holder.join()
+        waiter.join()
+        self.assertEqual([response.status_code for response in responses], [204, 204])
+        self.assertEqual(LimitedView.stats.gauges(), {'in_flight': 0, 'queued': 0})
+        self.assertIn('api_in_flight{view="LimitedView"} 0', self.client.get('/api/metrics').content.decode())
+
+    def test_view_limit(self):
+        limit = TooManyView.concurrency_limit
+        self.assertTrue(limit.acquire())
+        try:
+            response = self.client.get('/api/too_many/')
+        finally:
+            limit.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(self.client.get('/api/too_many/').status_code, 204)
+
+    def test_swagger(self):
+        responses = LimitedView.swagger_spec.spec['get']['responses']
+        self.assertIn('Retry-After', responses['503']['headers'])
+        self.assertIn('429', TooManyView.swagger_spec.spec['get']['responses'])
+        validate(router.swagger())
+
+    def test_stream(self):
+        limit = LimitedStreamView.concurrency_limit
+        response = self.client.get('/api/limited_stream/')
+        self.assertTrue(response.streaming)
+        # slot is held until the body is sent
+        self.assertEqual(limit.in_flight, 1)
+        self.assertEqual(self.client.get('/api/limited_stream/').status_code, 503)
+        self.assertEqual(json.loads(b''.join(response.streaming_content).decode('utf-8')), [0, 1, 2])
+        self.assertEqual(limit.in_flight, 0)
+
+        response = self.client.post('/api/batch/', json.dumps([{'operation': 'LimitedStream'}]), 'application/json')
+        self.assertEqual(response.json(), [{'status': 200, 'body': [0, 1, 2]}])
+        self.assertEqual(limit.in_flight, 0)
+
+    def test_cancelled_wait(self):
+        limit = ConcurrencyLimit(1, max_queue=1, queue_timeout=5)
+
+        async def run():
+            self.assertTrue(limit.acquire())
+            waiter = asyncio.ensure_future(limit.aacquire())
+            while limit.queued != 1:
+                await asyncio.sleep(0.001)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            limit.release()
+            # abandoned slot is taken by the executor thread and given back
+            while limit.in_flight or limit.queued:
+                await asyncio.sleep(0.001)
+
+        async_to_sync(run)()
+        self.assertTrue(limit.acquire())
+        limit.release()
+
+    def test_config(self):
+        with self.assertRaises(ConfigurationError):
+            ConcurrencyLimit(1, status=500)
+
+
+class CoalesceTest(TestCase):
+    def setUp(self):
+        CoalescedView.calls = 0
+        CoalescedView.started.clear()
+        CoalescedView.release.clear()
+        self.addCleanup(CoalescedView.release.set)
+
+    def concurrent(self, query, count=4, **headers):
+        """Responses of ``count`` requests sent while the first one is being handled."""
+        responses = [None] * count
+
+        def request(idx):
+            try:
+                responses[idx] = self.client.get('/api/coalesced/', query, **headers)
+            except ValueError as err:
+                responses[idx] = err
+
+        threads = [threading.Thread(target=request, args=(0,))]
+        threads[0].start()
+        self.assertTrue(CoalescedView.started.wait(5))
+        for idx in range(1, count):
+            threads.append(threading.Thread(target=request, args=(idx,)))
+            threads[-1].start()
+        while CoalescedView.single_flight.waiting != count - 1:
+            time.sleep(0.001)
+        CoalescedView.release.set()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_shared(self):
+        coalesced = CoalescedView.stats['coalesced']
+        responses = self.concurrent({'q': 'a'})
+        self.assertEqual(CoalescedView.calls, 1)
+        self.assertEqual(CoalescedView.stats['coalesced'], coalesced + 3)
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {'q': 'a', 'calls': 1})
+        self.assertEqual(CoalescedView.single_flight.in_flight, 0)
+
+        # finished calls aren't shared
+        self.assertEqual(self.client.get('/api/coalesced/', {'q': 'a'}).json(), {'q': 'a', 'calls': 2})
+
+    def test_status(self):
+        responses = self.concurrent({'q': 'missing'})
+        self.assertEqual(CoalescedView.calls, 1)
+        self.assertEqual([response.status_code for response in responses], [404] * 4)
+
+    def test_error(self):
+        with self.settings(DEBUG_PROPAGATE_EXCEPTIONS=True):
+            responses = self.concurrent({'q': 'a', 'fail': 'true'})
+        self.assertEqual(CoalescedView.calls, 1)
+        for response in responses:
+            self.assertIsInstance(response, ValueError)
+        self.assertEqual(CoalescedView.single_flight.in_flight, 0)
+
+    def test_per_request(self):
+        responses = self.concurrent({'q': 'a'}, count=2, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(CoalescedView.calls, 1)
+        for response in responses:
+            self.assertEqual(response.json(), {'q': 'a', 'calls': 1})
+
+        # different queries and wire formats aren't shared
+        CoalescedView.release.set()
+        self.assertEqual(self.client.get('/api/coalesced/', {'q': 'b'}).json()['calls'], 2)
+        response = self.client.get('/api/coalesced/', {'q': 'a'}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(unpackb(response.content), {'q': 'a', 'calls': 3})
+
+    def test_single_flight(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), (1, True))
+
+        async def leader():
+            await asyncio.sleep(0.01)
+            return 2
+
+        async def run():
+            return await asyncio.gather(flight.ado('key', leader), flight.ado('key', leader))
+
+        self.assertEqual(async_to_sync(run)(), [(2, True), (2, False)])
+
+    def test_single_flight_executor(self):
+        flight = SingleFlight()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.set_default_executor(ThreadPoolExecutor(2))
+
+        async def leader():
+            await asyncio.sleep(0.01)
+            # followers must leave the default executor to the leader
+            return await loop.run_in_executor(None, lambda: 3)
+
+        async def run():
+            return await asyncio.gather(*[flight.ado('key', leader) for _ in range(5)])
+
+        results = loop.run_until_complete(asyncio.wait_for(run(), 5))
+        self.assertEqual(results, [(3, True)] + [(3, False)] * 4)
+
+        # follower on a loop while the leader runs on another thread
+        started, release = threading.Event(), threading.Event()
+
+        def sync_leader():
+            started.set()
+            release.wait(5)
+            return 4
+
+        thread = threading.Thread(target=flight.do, args=('key', sync_leader))
+        thread.start()
+        self.assertTrue(started.wait(5))
+
+        async def follow():
+            waiter = asyncio.ensure_future(flight.ado('key', leader))
+            while flight.waiting != 1:
+                await asyncio.sleep(0.001)
+            release.set()
+            return await waiter
+
+        self.assertEqual(loop.run_until_complete(asyncio.wait_for(follow(), 5)), (4, False))
+        thread.join()
+
+    def test_config(self):
+        with self.assertRaises(ConfigurationError):
+            Spec(Method.POST, s.Object(), Response(200), coalesce=True)